@@ -1,23 +1,37 @@
 import os
+import sys
+import json
 import pandas as pd
 import folium
-from folium.plugins import MarkerCluster
-from matplotlib import cm, colors
+from folium.plugins import FastMarkerCluster, HeatMap
+from matplotlib import colors
+import matplotlib.pyplot as plt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+from regioes import carregar_regioes
 
 # ============================================================
 # CONFIGURAÇÕES
 # ============================================================
 BASE_DIR = "/Users/trash/Downloads/Projeto_Disciplina/Cidade_sp"
-OBS_FILE = os.path.join(BASE_DIR, "data_filtered/observations_sao_paulo.csv")
+REGIAO = "sao_paulo"  # chave em app/regioes.json
+OBS_FILE = os.path.join(BASE_DIR, f"data_filtered/observations_{REGIAO}")
 CLUSTER_FILE = os.path.join(BASE_DIR, "processed/user_clusters_kmeans_final.csv")
 
 OUTPUT_MAP_DIR = os.path.join(BASE_DIR, "processed", "maps")
+
+# Camada do mapa:
+#   "fast_cluster" -> FastMarkerCluster (marcadores criados no navegador a partir de um array)
+#   "geojson"      -> uma única FeatureCollection GeoJSON (também salva em .geojson)
+#   "heatmap"      -> um HeatMap por cluster, com controle de camadas
+MODO = "fast_cluster"
+AMOSTRA_POR_CLUSTER = None  # ex.: 5000 pontos por cluster; None = todos
 os.makedirs(OUTPUT_MAP_DIR, exist_ok=True)
 
 # ============================================================
 # 1️⃣ CARREGAR DADOS
 # ============================================================
-obs = pd.read_csv(OBS_FILE)
+obs = pd.read_parquet(OBS_FILE, columns=["user_login", "latitude", "longitude", "scientific_name"])
 clusters = pd.read_csv(CLUSTER_FILE)
 
 # Garantir nomes das colunas
@@ -38,29 +52,73 @@ df = obs.merge(clusters, on="user_login", how="inner")
 # ============================================================
 # 2️⃣ CRIAR MAPA INTERATIVO
 # ============================================================
-sp_center = [-23.55, -46.63]
-m = folium.Map(location=sp_center, zoom_start=11)
+centro = carregar_regioes()[REGIAO]["centro"]
+m = folium.Map(location=centro, zoom_start=11)
 
 # Gerar cores para cada cluster
 n_clusters = df["cluster"].nunique()
-cmap = cm.get_cmap("tab20", n_clusters)
+cmap = plt.get_cmap("tab20", n_clusters)
 cluster_colors = {i: colors.rgb2hex(cmap(i)) for i in sorted(df["cluster"].unique())}
 
-# Adicionar pontos com MarkerCluster
-marker_cluster = MarkerCluster().add_to(m)
-for _, row in df.iterrows():
-    folium.CircleMarker(
-        location=[row[lat_col], row[lon_col]],
-        radius=4,
-        color=cluster_colors[row["cluster"]],
-        fill=True,
-        fill_opacity=0.7,
-        popup=f"Cluster: {row['cluster']}<br>User: {row['user_login']}<br>Species: {row['scientific_name']}"
-    ).add_to(marker_cluster)
+# Amostragem opcional por cluster
+if AMOSTRA_POR_CLUSTER is not None:
+    df = df.sample(frac=1, random_state=42).groupby("cluster").head(AMOSTRA_POR_CLUSTER)
+
+# Colunas como listas Python: nenhuma iteração linha a linha de DataFrame
+lats = df[lat_col].round(6).tolist()
+lons = df[lon_col].round(6).tolist()
+cores = df["cluster"].map(cluster_colors).tolist()
+popups = (
+    "Cluster: " + df["cluster"].astype(str) +
+    "<br>User: " + df["user_login"].astype(str) +
+    "<br>Species: " + df["scientific_name"].astype(str)
+).tolist()
+
+if MODO == "fast_cluster":
+    callback = """
+    function (row) {
+        var marker = L.circleMarker(new L.LatLng(row[0], row[1]),
+            {radius: 4, color: row[2], fill: true, fillOpacity: 0.7});
+        marker.bindPopup(row[3]);
+        return marker;
+    };
+    """
+    FastMarkerCluster(list(zip(lats, lons, cores, popups)), callback=callback).add_to(m)
+
+elif MODO == "geojson":
+    feature_collection = {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [lon, lat]},
+                "properties": {"color": cor, "popup": popup},
+            }
+            for lat, lon, cor, popup in zip(lats, lons, cores, popups)
+        ],
+    }
+    geojson_file = os.path.join(OUTPUT_MAP_DIR, "cluster_points.geojson")
+    with open(geojson_file, "w", encoding="utf-8") as f:
+        json.dump(feature_collection, f)
+    print(f"✅ GeoJSON salvo em: {geojson_file}")
+
+    folium.GeoJson(
+        feature_collection,
+        marker=folium.CircleMarker(radius=4, fill=True, fill_opacity=0.7),
+        style_function=lambda feature: {"color": feature["properties"]["color"], "fillColor": feature["properties"]["color"]},
+        popup=folium.GeoJsonPopup(fields=["popup"], labels=False),
+    ).add_to(m)
+
+elif MODO == "heatmap":
+    for cluster_id, grupo in df.groupby("cluster"):
+        camada = folium.FeatureGroup(name=f"Cluster {cluster_id}")
+        HeatMap(grupo[[lat_col, lon_col]].values.tolist(), radius=8).add_to(camada)
+        camada.add_to(m)
+    folium.LayerControl().add_to(m)
 
 # ============================================================
 # 3️⃣ SALVAR MAPA
 # ============================================================
-map_file = os.path.join(OUTPUT_MAP_DIR, "cluster_map_interactive_kmeans.html")
+map_file = os.path.join(OUTPUT_MAP_DIR, f"cluster_map_interactive_kmeans_{MODO}.html")
 m.save(map_file)
 print(f"✅ Mapa interativo salvo em: {map_file}")
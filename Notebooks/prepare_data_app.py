@@ -1,87 +1,459 @@
 import pandas as pd
 import numpy as np
+import scipy.sparse as sp
 from sklearn.metrics.pairwise import cosine_similarity
+import argparse
+import json
 import os
-import shutil # Usaremos para limpar a pasta de artefatos antigos
+import sys
+import shutil # Usaremos para remover versões antigas dos artefatos
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
 
-print("--- Iniciando a preparação de dados para o App Birdédex GO ---")
+# O registro de regiões e a definição das estações vêm do próprio app
+sys.path.insert(0, os.path.join('..', 'app'))
+from regioes import carregar_regioes, estacao_do_mes, REGIAO_PADRAO
+from espacial import construir_indice_espacial, construir_grade_densidade
+from artefatos import carregar_artefatos, pasta_publicada, ESTACOES, EXTENSAO_PONTEIRO
+from recomendacao import recomendar_em_lote, TOP_N_PRECALCULADO
 
-# --- 1. CARREGAMENTO DOS DADOS LOCAIS ---
-print("1. Carregando dados de entrada locais...")
-path_clusters = os.path.join('processed', 'user_clusters_kmeans_final.csv')
-path_obs = os.path.join('data_filtered', 'observations_sao_paulo.csv')
-try:
-    df_clusters_raw = pd.read_csv(path_clusters)
-    df_obs_raw = pd.read_csv(path_obs)
+# Módulos de scripts/: rótulos do HDBSCAN e contagens por bincount (o modelo de clusterização,
+# que depende do umap, só é importado em ler_clusters quando há um modelo salvo)
+sys.path.insert(0, os.path.join('..', 'scripts'))
+from outlier_labels import read_outlier_labels, LABELS_PATH as OUTLIER_LABELS_PATH, LEGACY_LABELS_PATH as OUTLIER_LEGACY_LABELS_PATH
+from cluster_stats import group_counts, top_k_per_group
+
+ARTIFACTS_DIR = os.path.join('..', 'app', 'artifacts')
+# Cada publicação grava uma versão completa em artifacts/_versoes/<regiao>/<versao>/ e troca
+# o link artifacts/<regiao> de forma atômica; o app nunca vê uma pasta pela metade. Sem permissão
+# para criar links (Windows sem modo de desenvolvedor), grava o arquivo artifacts/<regiao>.versao.
+VERSOES_DIR = os.path.join(ARTIFACTS_DIR, '_versoes')
+MANTER_VERSOES = 2
+
+COLUNAS_OBS = ['id', 'user_login', 'observed_on', 'latitude', 'longitude', 'scientific_name', 'common_name', 'image_url']
+
+
+def caminho_processado(chave, nome):
+    """Arquivo da região em processed/<regiao>/; a região padrão também aceita o arquivo antigo em processed/.
+
+    Os scripts de clusterização (scripts/, pipeline.py) ainda leem só o dataset
+    da região padrão e gravam em processed/: as outras regiões só têm clusters
+    se os arquivos forem colocados em processed/<regiao>/ à mão.
+    """
+    caminho = os.path.join('processed', chave, nome)
+    if not os.path.exists(caminho) and chave == REGIAO_PADRAO:
+        caminho = os.path.join('processed', nome)
+    return caminho
+
+
+def ler_clusters(chave, df_obs_raw, conhecidos=None):
+    """Cluster de cada usuário das observações.
+
+    Usuários fora do arquivo de clusters recebem, nesta ordem, o cluster já
+    gravado no bundle (`conhecidos`, na atualização incremental), -1 se o
+    HDBSCAN os marcou como outliers (o KMeans final é ajustado sem eles) ou o
+    centróide mais próximo pelo modelo salvo por 03_fit_final_clusters.py. Sem
+    modelo, caem no cluster -1 (recomendação por similaridade).
+    """
+    path_clusters = caminho_processado(chave, 'user_clusters_kmeans_final.csv')
+    if os.path.exists(path_clusters):
+        df_clusters = pd.read_csv(path_clusters, usecols=['user_login', 'cluster'])
+    else:
+        print(f"   AVISO: {path_clusters} não encontrado; usuários da região ficam sem cluster.")
+        df_clusters = pd.DataFrame({'user_login': pd.Series(dtype=str), 'cluster': pd.Series(dtype=int)})
+
+    if conhecidos is not None:
+        df_clusters = pd.concat([df_clusters, conhecidos[~conhecidos['user_login'].isin(df_clusters['user_login'])]])
+
+    # Usuários que o HDBSCAN já rotulou não são novos: os outliers ficam com -1
+    # (o CSV antigo que read_outlier_labels também aceita é o da região padrão)
+    path_rotulos = caminho_processado(chave, os.path.basename(OUTLIER_LABELS_PATH))
+    if os.path.exists(path_rotulos) or (chave == REGIAO_PADRAO and os.path.exists(OUTLIER_LEGACY_LABELS_PATH)):
+        rotulados = read_outlier_labels(path_rotulos)
+    else:
+        rotulados = pd.DataFrame({'user_login': pd.Series(dtype=str), 'is_outlier': pd.Series(dtype=bool)})
+    outliers = rotulados.loc[rotulados['is_outlier'] & ~rotulados['user_login'].isin(df_clusters['user_login']), ['user_login']]
+    df_clusters = pd.concat([df_clusters, outliers.assign(cluster=-1)], ignore_index=True)
+
+    novos = df_obs_raw[~df_obs_raw['user_login'].isin(df_clusters['user_login']) & ~df_obs_raw['user_login'].isin(rotulados['user_login'])]
+    path_modelo = caminho_processado(chave, 'cluster_model.joblib')
+    if len(novos) and os.path.exists(path_modelo):
+        # umap-learn e joblib (dependências de scripts/) só são necessários neste caso
+        from cluster_model import load_cluster_model, assign_clusters
+        atribuidos = assign_clusters(load_cluster_model(path_modelo), novos)
+        print(f"   ... {len(atribuidos)} usuários novos atribuídos ao cluster mais próximo.")
+        df_clusters = pd.concat([df_clusters, atribuidos[['user_login', 'cluster']]], ignore_index=True)
+    return df_clusters
+
+
+def limpar_observacoes(df_obs_raw, df_clusters_raw, regiao):
+    """Junta o cluster de cada usuário às observações, limpa e adiciona mês e estação."""
+    df_merged = df_obs_raw.merge(df_clusters_raw[['user_login', 'cluster']], on='user_login', how='left')
+    df_merged['cluster'].fillna(-1, inplace=True)
+    df_merged['cluster'] = df_merged['cluster'].astype(int)
+    df_merged['observed_on'] = pd.to_datetime(df_merged['observed_on'], errors='coerce')
+    df_merged.dropna(subset=['observed_on', 'user_login', 'scientific_name', 'common_name', 'image_url'], inplace=True)
+    df_merged['common_name'] = df_merged['common_name'].str.split(';').str[0].str.strip()
+    df_merged['month'] = df_merged['observed_on'].dt.month
+    # As estações dependem do hemisfério da região
+    df_merged['estacao'] = df_merged['month'].apply(estacao_do_mes, hemisferio=regiao['hemisferio'])
+    return df_merged
+
+
+def estender_vocabulario(vocabulario, df_merged):
+    """Vocabulário de espécies: species_id (int32) <-> scientific_name <-> common_name <-> image_url.
+
+    Sem vocabulário anterior, as espécies são numeradas em ordem alfabética. Numa
+    atualização incremental os ids existentes não mudam e as espécies novas
+    recebem ids no fim.
+    """
+    novas = (
+        df_merged.drop_duplicates(subset='scientific_name')
+                 .sort_values('scientific_name')[['scientific_name', 'common_name', 'image_url']]
+                 .reset_index(drop=True)
+    )
+    if vocabulario is None:
+        inicio = 0
+    else:
+        novas = novas[~novas['scientific_name'].isin(vocabulario['scientific_name'])].reset_index(drop=True)
+        inicio = len(vocabulario)
+    novas.insert(0, 'species_id', np.arange(inicio, inicio + len(novas), dtype=np.int32))
+    return novas if vocabulario is None else pd.concat([vocabulario, novas], ignore_index=True)
+
+
+def agregar(df_merged):
+    """Contagens que sustentam os artefatos: (cluster, species_id) e (species_id, estacao)."""
+    # bincount sobre códigos inteiros das chaves, no lugar de groupby(...).size()
+    contagens_cluster = group_counts(df_merged, ['cluster', 'species_id'], name='n_registros')
+    contagens_estacao = group_counts(df_merged, ['species_id', 'estacao'], name='n_observacoes')
+    return contagens_cluster, contagens_estacao
+
+
+def somar_agregados(atual, novo, chaves):
+    """Soma duas tabelas de contagens com as mesmas chaves, mantendo a ordem por chave."""
+    coluna = [c for c in atual.columns if c not in chaves][0]
+    return pd.concat([atual, novo]).groupby(chaves, as_index=False)[coluna].sum()
+
+
+def derivar_artefatos(df_obs_app, vocabulario, contagens_cluster, contagens_estacao):
+    """Calcula os artefatos do app a partir das observações e das contagens agregadas."""
+
+    # --- 3. CÁLCULO DO PERFIL DOS CLUSTERS ---
+    print("3. Calculando o perfil de espécies de cada cluster...")
+    total_registros_cluster = contagens_cluster.groupby('cluster')['n_registros'].sum().reset_index(name='total_registros')
+    species_counts = contagens_cluster.merge(total_registros_cluster, on='cluster', how='left')
+    species_counts['freq_relativa'] = species_counts['n_registros'] / species_counts['total_registros'] # Coluna é 'freq_relativa'
+    top_species_per_cluster = top_k_per_group(species_counts, 'cluster', 'freq_relativa', 15, prop_col=None)
+    perfil_especies_cluster = top_species_per_cluster.groupby('cluster')['species_id'].apply(list).reset_index(name='especies_mais_comuns')
+    print("   ... Perfis de cluster definidos.")
+
+    # --- 4. CÁLCULO DA SAZONALIDADE ---
+    print("4. Calculando a sazonalidade das espécies...")
+    sazonalidade = contagens_estacao.copy()
+    total_por_especie = sazonalidade.groupby('species_id')['n_observacoes'].sum().reset_index(name='total_especie')
+    sazonalidade = sazonalidade.merge(total_por_especie, on='species_id')
+    sazonalidade['freq_relativa'] = sazonalidade['n_observacoes'] / sazonalidade['total_especie']
+    max_freq = sazonalidade.groupby('species_id')['freq_relativa'].max().reset_index().rename(columns={'freq_relativa': 'freq_relativa_max'})
+    sazonalidade_merge = sazonalidade.merge(max_freq, on='species_id')
+    sazonalidade_merge['diff_relativa'] = sazonalidade_merge['freq_relativa_max'] - sazonalidade_merge['freq_relativa']
+    dominantes = sazonalidade_merge[sazonalidade_merge['diff_relativa'] <= 0.10]
+    estacao_dominante = dominantes.groupby('species_id')['estacao'].apply(list).reset_index()
+
+    # Uma máscara booleana por estação sobre o vocabulário de espécies: o app só escolhe a coluna da estação atual
+    estacoes_especies = (
+        pd.crosstab(dominantes['species_id'], dominantes['estacao']).gt(0)
+          .reindex(index=vocabulario['species_id'], columns=['Verão', 'Outono', 'Inverno', 'Primavera'], fill_value=False)
+          .rename_axis(index='species_id', columns=None)
+          .reset_index()
+    )
+    print("   ... Sazonalidade calculada.")
+
+    # Ranking de popularidade (nº de registros, empate pelo species_id): geral e, por estação,
+    # só as espécies em alta. É a lista de recomendação de novos usuários.
+    n_registros = np.bincount(
+        contagens_estacao['species_id'], weights=contagens_estacao['n_observacoes'], minlength=len(vocabulario)
+    ).astype(np.int64)
+    ordem_popularidade = np.lexsort((np.arange(len(vocabulario)), -n_registros))
+    ordem_popularidade = ordem_popularidade[n_registros[ordem_popularidade] > 0]
+    rankings = {'Geral': ordem_popularidade}
+    for nome_estacao in ESTACOES:
+        rankings[nome_estacao] = ordem_popularidade[estacoes_especies[nome_estacao].to_numpy()[ordem_popularidade]]
+    ranking_popularidade = pd.concat([
+        pd.DataFrame({
+            'escopo': escopo,
+            'posicao': np.arange(1, len(ids) + 1, dtype=np.int32),
+            'species_id': ids.astype(np.int32),
+            'n_registros': n_registros[ids],
+        })
+        for escopo, ids in rankings.items()
+    ], ignore_index=True)
+    print("   ... Ranking de popularidade calculado.")
+
+    # --- 5. CÁLCULO DAS MATRIZES DE SIMILARIDADE ---
+    print("5. Calculando matrizes de similaridade para o sistema de fallback...")
+
+    # <<-- CORREÇÃO APLICADA AQUI -->>
+    # O valor da coluna 'values' foi corrigido de 'freq_rel' para 'freq_relativa'
+    mat_cluster_especie = species_counts.pivot_table(index='cluster', columns='species_id', values='freq_relativa', fill_value=0)
+    mat_cluster_especie = mat_cluster_especie.reindex(columns=vocabulario['species_id'], fill_value=0)
+
+    sim_clusters = pd.DataFrame(cosine_similarity(mat_cluster_especie), index=mat_cluster_especie.index, columns=mat_cluster_especie.index)
+    print("   ... Matrizes de similaridade criadas.")
+
+    # --- 6. ÍNDICE DE USUÁRIOS ---
+    print("6. Construindo o índice de usuários...")
+    # Observações ordenadas por usuário: as linhas de cada usuário ficam contíguas e as médias saem por reduceat
+    df_obs_app = df_obs_app.sort_values('user_login', kind='stable').reset_index(drop=True)
+
+    # O bit i do bitset de espécies vistas corresponde ao species_id i
+    n_especies = len(vocabulario)
+    codigo_usuario, logins = pd.factorize(df_obs_app['user_login'], sort=True)
+    codigo_especie = df_obs_app['species_id'].to_numpy(dtype=np.int64)
+
+    linha_inicio = np.flatnonzero(np.r_[True, codigo_usuario[1:] != codigo_usuario[:-1]])
+    linha_fim = np.r_[linha_inicio[1:], len(df_obs_app)]
+
+    pares = np.unique(codigo_usuario.astype(np.int64) * n_especies + codigo_especie)
+    pares_usuario, pares_especie = np.divmod(pares, n_especies)
+    bits_vistas = np.zeros((len(logins), (n_especies + 7) // 8), dtype=np.uint8)
+    np.bitwise_or.at(bits_vistas, (pares_usuario, pares_especie // 8), (128 >> (pares_especie % 8)).astype(np.uint8))
+
+    indice_usuarios = pd.DataFrame({
+        'user_login': logins,
+        'cluster': df_obs_app['cluster'].to_numpy()[linha_inicio],
+        'lat_media': np.add.reduceat(df_obs_app['latitude'].to_numpy(dtype=float), linha_inicio) / (linha_fim - linha_inicio),
+        'lon_media': np.add.reduceat(df_obs_app['longitude'].to_numpy(dtype=float), linha_inicio) / (linha_fim - linha_inicio),
+        'especies_vistas': [linha.tobytes() for linha in bits_vistas],
+    })
+    print(f"   ... Índice criado para {len(indice_usuarios)} usuários.")
+
+    # --- 7. ÍNDICE ESPACIAL POR ESPÉCIE ---
+    print("7. Construindo o índice espacial das espécies...")
+    pontos_espaciais, celulas_espaciais = construir_indice_espacial(
+        df_obs_app['species_id'], df_obs_app['latitude'], df_obs_app['longitude']
+    )
+    print(f"   ... {len(celulas_espaciais)} células (espécie × grade) indexadas.")
+
+    # Grade de densidade para reordenar recomendações pela abundância perto do usuário
+    densidade_especies, densidade_celulas = construir_grade_densidade(
+        df_obs_app['species_id'], df_obs_app['latitude'], df_obs_app['longitude'], len(vocabulario)
+    )
+    print(f"   ... Grade de densidade com {densidade_especies.shape[0]} células.")
+
+    return {
+        'df_obs_app': df_obs_app,
+        'vocabulario': vocabulario,
+        'contagens_cluster': contagens_cluster,
+        'contagens_estacao': contagens_estacao,
+        'perfil_especies_cluster': perfil_especies_cluster,
+        'estacao_dominante': estacao_dominante,
+        'estacoes_especies': estacoes_especies,
+        'ranking_popularidade': ranking_popularidade,
+        'mat_cluster_especie': mat_cluster_especie,
+        'sim_clusters': sim_clusters,
+        'indice_usuarios': indice_usuarios,
+        'pontos_espaciais': pontos_espaciais,
+        'celulas_espaciais': celulas_espaciais,
+        'densidade_especies': densidade_especies,
+        'densidade_celulas': densidade_celulas,
+    }
+
+
+def escrever_bundle(output_dir, chave, regiao, a):
+    """Grava todos os arquivos de uma versão do bundle e as recomendações pré-calculadas."""
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Nomes e imagens ficam só no vocabulário; as observações guardam apenas o species_id
+    a['vocabulario'].to_parquet(os.path.join(output_dir, 'vocabulario_especies.parquet'))
+    a['df_obs_app'].to_parquet(os.path.join(output_dir, 'observations_processed.parquet'))
+    a['perfil_especies_cluster'].to_parquet(os.path.join(output_dir, 'perfil_especies_cluster.parquet'))
+    a['estacao_dominante'].to_parquet(os.path.join(output_dir, 'sazonalidade_especies.parquet'))
+    a['estacoes_especies'].to_parquet(os.path.join(output_dir, 'estacoes_especies.parquet'))
+    a['mat_cluster_especie'].to_csv(os.path.join(output_dir, 'mat_cluster_especie.csv'))
+    a['sim_clusters'].to_csv(os.path.join(output_dir, 'sim_clusters.csv'))
+    a['indice_usuarios'].to_parquet(os.path.join(output_dir, 'indice_usuarios.parquet'))
+    a['pontos_espaciais'].to_feather(os.path.join(output_dir, 'indice_espacial_pontos.feather'), compression='uncompressed')
+    a['celulas_espaciais'].to_parquet(os.path.join(output_dir, 'indice_espacial_celulas.parquet'), index=False)
+    sp.save_npz(os.path.join(output_dir, 'densidade_especies.npz'), a['densidade_especies'])
+    a['densidade_celulas'].to_parquet(os.path.join(output_dir, 'densidade_celulas.parquet'), index=False)
+    a['ranking_popularidade'].to_parquet(os.path.join(output_dir, 'ranking_popularidade.parquet'), index=False)
+    # Contagens agregadas: base das atualizações incrementais (--incremental)
+    a['contagens_cluster'].to_parquet(os.path.join(output_dir, 'agregado_cluster_especie.parquet'), index=False)
+    a['contagens_estacao'].to_parquet(os.path.join(output_dir, 'agregado_especie_estacao.parquet'), index=False)
+    # Metadados da região (nome, centro do mapa, hemisfério) para o app
+    with open(os.path.join(output_dir, 'regiao.json'), 'w', encoding='utf-8') as f:
+        json.dump({'chave': chave, **regiao}, f, ensure_ascii=False, indent=2)
+
+    # --- 9. RECOMENDAÇÕES PRÉ-CALCULADAS ---
+    # O app responde por consulta: uma lista por (usuário, estação); novos usuários usam o ranking de popularidade
+    print("9. Pré-calculando as recomendações por usuário e estação...")
+    artefatos_app = carregar_artefatos(os.path.basename(output_dir), os.path.dirname(output_dir))
+    tabelas = []
+    for nome_estacao in ESTACOES:
+        lote = recomendar_em_lote(artefatos_app, nome_estacao, top_n=TOP_N_PRECALCULADO)
+        lote.insert(0, 'estacao', nome_estacao)
+        lote.insert(1, 'linha_usuario', artefatos_app['indice_usuarios'].index.get_indexer(lote.pop('user_login')).astype(np.int32))
+        tabelas.append(lote)
+    pd.concat(tabelas, ignore_index=True).to_parquet(os.path.join(output_dir, 'recomendacoes.parquet'), index=False)
+    print(f"   ... Recomendações salvas para {len(artefatos_app['indice_usuarios'])} usuários × {len(ESTACOES)} estações.")
+
+
+def publicar_bundle(chave, regiao, a):
+    """Grava uma nova versão do bundle e troca o link artifacts/<regiao> para ela de forma atômica."""
+    print("8. Salvando a nova versão dos artefatos...")
+    versoes_regiao = os.path.join(VERSOES_DIR, chave)
+    versao = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+    output_dir = os.path.join(versoes_regiao, versao)
+
+    # A versão é gravada numa pasta temporária e só ganha o nome final quando está completa
+    pasta_temporaria = f"{output_dir}.tmp"
+    escrever_bundle(pasta_temporaria, chave, regiao, a)
+    os.rename(pasta_temporaria, output_dir)
+
+    link = os.path.join(ARTIFACTS_DIR, chave)
+    if os.path.isdir(link) and not os.path.islink(link):
+        # Layout antigo (pasta comum): vira uma versão, datada pela modificação, para que o link ocupe o lugar dela
+        versao_anterior = datetime.fromtimestamp(os.path.getmtime(link)).strftime('%Y%m%d-%H%M%S-%f')
+        os.rename(link, os.path.join(versoes_regiao, versao_anterior))
+
+    # os.replace de um link sobre outro é atômico: quem abrir artifacts/<regiao> vê a versão antiga ou a nova
+    destino = os.path.relpath(output_dir, ARTIFACTS_DIR)
+    ponteiro = link + EXTENSAO_PONTEIRO
+    link_temporario = f"{link}.tmp{os.getpid()}"
+    try:
+        os.symlink(destino, link_temporario, target_is_directory=True)
+    except OSError:
+        # Sem permissão para links: o caminho da versão vai para artifacts/<regiao>.versao,
+        # trocado com o mesmo os.replace; o app lê esse arquivo antes do link
+        print("   AVISO: não foi possível criar o link; publicando a versão em " + ponteiro)
+        with open(link_temporario, 'w', encoding='utf-8') as f:
+            f.write(destino)
+        os.replace(link_temporario, ponteiro)
+        if os.path.islink(link):
+            os.remove(link)
+        link = ponteiro
+    else:
+        os.replace(link_temporario, link)
+        if os.path.exists(ponteiro):
+            os.remove(ponteiro)
+
+    # Mantém a versão anterior (sessões ainda podem estar lendo dela) e remove as mais antigas
+    versoes = sorted(v for v in os.listdir(versoes_regiao) if not v.endswith('.tmp'))
+    for antiga in versoes[:-MANTER_VERSOES]:
+        shutil.rmtree(os.path.join(versoes_regiao, antiga), ignore_errors=True)
+    return link
+
+
+def preparar_regiao(chave, regiao):
+    """Gera o bundle de artefatos do app para uma região a partir do dataset completo."""
+    print(f"--- [{regiao['nome']}] ---")
+
+    # --- 1. CARREGAMENTO DOS DADOS LOCAIS ---
+    print("1. Carregando dados de entrada locais...")
+    path_obs = os.path.join('data_filtered', f'observations_{chave}')  # dataset Parquet gerado por 00_filter_SP.py
+    try:
+        df_obs_raw = pd.read_parquet(path_obs, columns=COLUNAS_OBS)
+    except FileNotFoundError as e:
+        print(f"   ERRO: Arquivo não encontrado: {e}.")
+        print("   Certifique-se de que este script está na pasta 'Notebooks' e que os arquivos de dados existem nas subpastas corretas.")
+        return None
+    df_clusters_raw = ler_clusters(chave, df_obs_raw)
     print("   ... Dados carregados com sucesso.")
-except FileNotFoundError as e:
-    print(f"   ERRO: Arquivo não encontrado: {e}.")
-    print("   Certifique-se de que este script está na pasta 'Notebooks' e que os arquivos de dados existem nas subpastas corretas.")
-    exit()
-
-# --- 2. JUNÇÃO, LIMPEZA E FORMATAÇÃO DOS DADOS ---
-print("2. Juntando clusters com observações, limpando e formatando...")
-df_merged = df_obs_raw.merge(df_clusters_raw[['user_login', 'cluster']], on='user_login', how='left')
-df_merged['cluster'].fillna(-1, inplace=True)
-df_merged['cluster'] = df_merged['cluster'].astype(int)
-df_merged['observed_on'] = pd.to_datetime(df_merged['observed_on'], errors='coerce')
-df_merged.dropna(subset=['observed_on', 'user_login', 'scientific_name', 'common_name', 'image_url'], inplace=True)
-df_merged['common_name'] = df_merged['common_name'].str.split(';').str[0].str.strip()
-df_merged['month'] = df_merged['observed_on'].dt.month
-print("   ... Junção e limpeza concluídas.")
-
-# --- 3. CÁLCULO DO PERFIL DOS CLUSTERS ---
-print("3. Calculando o perfil de espécies de cada cluster...")
-total_registros_cluster = df_merged.groupby('cluster').size().reset_index(name='total_registros')
-species_counts = df_merged.groupby(['cluster', 'scientific_name']).size().reset_index(name='n_registros')
-species_counts = species_counts.merge(total_registros_cluster, on='cluster', how='left')
-species_counts['freq_relativa'] = species_counts['n_registros'] / species_counts['total_registros'] # Coluna é 'freq_relativa'
-top_species_per_cluster = species_counts.sort_values(['cluster', 'freq_relativa'], ascending=[True, False]).groupby('cluster').head(15)
-perfil_especies_cluster = top_species_per_cluster.groupby('cluster')['scientific_name'].apply(list).reset_index(name='especies_mais_comuns')
-print("   ... Perfis de cluster definidos.")
-
-# --- 4. CÁLCULO DA SAZONALIDADE ---
-print("4. Calculando a sazonalidade das espécies...")
-def estacao(mes):
-    if mes in [12, 1, 2]: return 'Verão'
-    elif mes in [3, 4, 5]: return 'Outono'
-    elif mes in [6, 7, 8]: return 'Inverno'
-    else: return 'Primavera'
-df_merged['estacao'] = df_merged['month'].apply(estacao)
-sazonalidade = df_merged.groupby(['scientific_name', 'estacao']).size().reset_index(name='n_observacoes')
-total_por_especie = sazonalidade.groupby('scientific_name')['n_observacoes'].sum().reset_index(name='total_especie')
-sazonalidade = sazonalidade.merge(total_por_especie, on='scientific_name')
-sazonalidade['freq_relativa'] = sazonalidade['n_observacoes'] / sazonalidade['total_especie']
-max_freq = sazonalidade.groupby('scientific_name')['freq_relativa'].max().reset_index().rename(columns={'freq_relativa': 'freq_relativa_max'})
-sazonalidade_merge = sazonalidade.merge(max_freq, on='scientific_name')
-sazonalidade_merge['diff_relativa'] = sazonalidade_merge['freq_relativa_max'] - sazonalidade_merge['freq_relativa']
-dominantes = sazonalidade_merge[sazonalidade_merge['diff_relativa'] <= 0.10]
-estacao_dominante = dominantes.groupby('scientific_name')['estacao'].apply(list).reset_index()
-print("   ... Sazonalidade calculada.")
-
-# --- 5. CÁLCULO DAS MATRIZES DE SIMILARIDADE ---
-print("5. Calculando matrizes de similaridade para o sistema de fallback...")
-
-# <<-- CORREÇÃO APLICADA AQUI -->>
-# O valor da coluna 'values' foi corrigido de 'freq_rel' para 'freq_relativa'
-mat_cluster_especie = species_counts.pivot_table(index='cluster', columns='scientific_name', values='freq_relativa', fill_value=0)
-
-sim_clusters = pd.DataFrame(cosine_similarity(mat_cluster_especie), index=mat_cluster_especie.index, columns=mat_cluster_especie.index)
-print("   ... Matrizes de similaridade criadas.")
-
-# --- 6. SALVAR OS ARTEFATOS FINAIS ---
-print("6. Limpando artefatos antigos e salvando os novos...")
-output_dir = os.path.join('..', 'app', 'artifacts')
-# Limpa a pasta de artefatos antes de salvar, para garantir que não haja arquivos antigos
-if os.path.exists(output_dir):
-    shutil.rmtree(output_dir)
-os.makedirs(output_dir, exist_ok=True)
-
-df_merged.to_parquet(os.path.join(output_dir, 'observations_processed.parquet'))
-perfil_especies_cluster.to_parquet(os.path.join(output_dir, 'perfil_especies_cluster.parquet'))
-estacao_dominante.to_parquet(os.path.join(output_dir, 'sazonalidade_especies.parquet'))
-mat_cluster_especie.to_csv(os.path.join(output_dir, 'mat_cluster_especie.csv'))
-sim_clusters.to_csv(os.path.join(output_dir, 'sim_clusters.csv'))
-
-print("\n--- Preparação concluída com sucesso! ---")
-print(f"Os artefatos foram salvos em: {os.path.abspath(output_dir)}")
\ No newline at end of file
+
+    # --- 2. JUNÇÃO, LIMPEZA E FORMATAÇÃO DOS DADOS ---
+    print("2. Juntando clusters com observações, limpando e formatando...")
+    df_merged = limpar_observacoes(df_obs_raw, df_clusters_raw, regiao)
+    vocabulario = estender_vocabulario(None, df_merged)
+    df_merged['species_id'] = pd.Categorical(df_merged['scientific_name'], categories=vocabulario['scientific_name']).codes.astype(np.int32)
+    contagens_cluster, contagens_estacao = agregar(df_merged)
+    print(f"   ... Junção e limpeza concluídas ({len(vocabulario)} espécies no vocabulário).")
+
+    df_obs_app = df_merged.drop(columns=['scientific_name', 'common_name', 'image_url'])
+    a = derivar_artefatos(df_obs_app, vocabulario, contagens_cluster, contagens_estacao)
+    return publicar_bundle(chave, regiao, a)
+
+
+def atualizar_regiao(chave, regiao, caminho_lote):
+    """Atualização incremental: soma um lote de observações novas ao bundle publicado da região.
+
+    As contagens por (cluster, espécie) e (espécie, estação) são lidas do bundle
+    atual e somadas às do lote; perfis, sazonalidade e similaridade são
+    recalculados a partir delas, sem reler o dataset bruto nem refazer a
+    clusterização. Observações cujo id já está no bundle, ou que se repete no
+    próprio lote, são ignoradas.
+
+    O restante não é incremental: as observações do bundle são lidas inteiras e,
+    como os perfis dos clusters mudam com as contagens, o índice de usuários, os
+    índices espaciais e as recomendações de todos os usuários são refeitos. O
+    tempo cresce com o tamanho do bundle, não com o do lote.
+    """
+    print(f"--- [{regiao['nome']}] atualização incremental ---")
+    atual = pasta_publicada(chave, os.path.abspath(ARTIFACTS_DIR))
+
+    print("1. Carregando o bundle atual e o lote de observações novas...")
+    df_obs_app = pd.read_parquet(os.path.join(atual, 'observations_processed.parquet'))
+    vocabulario = pd.read_parquet(os.path.join(atual, 'vocabulario_especies.parquet'))
+    contagens_cluster = pd.read_parquet(os.path.join(atual, 'agregado_cluster_especie.parquet'))
+    contagens_estacao = pd.read_parquet(os.path.join(atual, 'agregado_especie_estacao.parquet'))
+    if caminho_lote.endswith('.csv'):
+        lote_raw = pd.read_csv(caminho_lote, usecols=COLUNAS_OBS)
+    else:
+        lote_raw = pd.read_parquet(caminho_lote, columns=COLUNAS_OBS)
+    print(f"   ... {len(lote_raw)} observações no lote.")
+
+    print("2. Limpando o lote e atualizando as contagens...")
+    # Usuários que já estão no bundle mantêm o cluster gravado
+    conhecidos = df_obs_app.drop_duplicates('user_login')[['user_login', 'cluster']]
+    lote = limpar_observacoes(lote_raw, ler_clusters(chave, lote_raw, conhecidos), regiao)
+    # Ids repetidos no próprio lote entram uma vez só
+    lote = lote[~lote['id'].isin(df_obs_app['id'])].drop_duplicates('id').copy()
+    if lote.empty:
+        print("   ... Nenhuma observação nova; bundle mantido.")
+        return atual
+
+    vocabulario = estender_vocabulario(vocabulario, lote)
+    lote['species_id'] = pd.Categorical(lote['scientific_name'], categories=vocabulario['scientific_name']).codes.astype(np.int32)
+    novas_cluster, novas_estacao = agregar(lote)
+    contagens_cluster = somar_agregados(contagens_cluster, novas_cluster, ['cluster', 'species_id'])
+    contagens_estacao = somar_agregados(contagens_estacao, novas_estacao, ['species_id', 'estacao'])
+    df_obs_app = pd.concat([df_obs_app, lote.drop(columns=['scientific_name', 'common_name', 'image_url'])], ignore_index=True)
+    print(f"   ... {len(lote)} observações novas ({len(vocabulario)} espécies no vocabulário).")
+
+    a = derivar_artefatos(df_obs_app, vocabulario, contagens_cluster, contagens_estacao)
+    return publicar_bundle(chave, regiao, a)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prepara os artefatos do App Birdédex GO.")
+    parser.add_argument('--incremental', metavar='LOTE',
+                        help="arquivo Parquet/CSV com observações novas a somar ao bundle publicado")
+    parser.add_argument('--regiao', default=REGIAO_PADRAO, help="região do lote incremental (chave em app/regioes.json)")
+    args = parser.parse_args()
+
+    print("--- Iniciando a preparação de dados para o App Birdédex GO ---")
+
+    if args.incremental:
+        link = atualizar_regiao(args.regiao, carregar_regioes()[args.regiao], args.incremental)
+        print("\n--- Atualização concluída com sucesso! ---")
+        print(f"Artefatos de '{args.regiao}' em: {os.path.abspath(link)}")
+        sys.exit()
+
+    # Uma região entra na preparação quando 00_filter_SP.py gerou o dataset dela
+    regioes = {
+        chave: regiao for chave, regiao in carregar_regioes().items()
+        if os.path.isdir(os.path.join('data_filtered', f'observations_{chave}'))
+    }
+    if not regioes:
+        print("   ERRO: Nenhum dataset de região encontrado em 'data_filtered'. Rode 00_filter_SP.py antes.")
+        exit()
+    print(f"Regiões: {', '.join(regiao['nome'] for regiao in regioes.values())}")
+
+    # Regiões independentes são preparadas em paralelo
+    with ProcessPoolExecutor(max_workers=min(len(regioes), os.cpu_count() or 1)) as executor:
+        futuros = {chave: executor.submit(preparar_regiao, chave, regiao) for chave, regiao in regioes.items()}
+        bundles = {chave: futuro.result() for chave, futuro in futuros.items()}
+
+    print("\n--- Preparação concluída com sucesso! ---")
+    for chave, output_dir in bundles.items():
+        if output_dir is not None:
+            print(f"Artefatos de '{chave}' salvos em: {os.path.abspath(output_dir)}")
@@ -0,0 +1,197 @@
+# Carregamento dos artefatos gerados por Notebooks/prepare_data_app.py.
+#
+# Cada região do registro (regioes.json) tem o seu bundle em artifacts/<regiao>/,
+# com um regiao.json de metadados (nome, centro do mapa, hemisfério). Esse caminho
+# é um link para a versão publicada em artifacts/_versoes/<regiao>/<versao>/, que o
+# prepare_data_app.py troca de forma atômica a cada nova versão. Onde não é possível
+# criar links (Windows sem modo de desenvolvedor), o caminho da versão fica num
+# arquivo artifacts/<regiao>.versao, também trocado de forma atômica.
+#
+# Os artefatos são lidos uma única vez por processo e compartilhados (somente
+# leitura) entre todas as sessões do Streamlit. A cada chamada só é verificada a
+# assinatura da pasta (versão, nome, mtime e tamanho dos arquivos); a releitura do
+# disco acontece apenas quando o prepare_data_app.py publica uma nova versão.
+
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow.feather as feather
+import scipy.sparse as sp
+from sklearn.preprocessing import normalize
+
+from espacial import TAMANHO_CELULA
+from recomendacao import TOP_N_PRECALCULADO
+from regioes import REGIAO_PADRAO
+
+ESTACOES = ['Verão', 'Outono', 'Inverno', 'Primavera']
+
+BASE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "artifacts")
+# Sufixo do arquivo que aponta a versão publicada quando o link não pôde ser criado
+EXTENSAO_PONTEIRO = ".versao"
+
+_lock = threading.Lock()
+_cache = {}  # pasta da região -> (assinatura, artefatos)
+
+
+def regioes_disponiveis(base_path=BASE_PATH):
+    """Retorna {chave: metadados} das regiões que têm bundle de artefatos gerado."""
+    regioes = {}
+    if not os.path.isdir(base_path):
+        return regioes
+    chaves = {nome.removesuffix(EXTENSAO_PONTEIRO) for nome in os.listdir(base_path)}
+    for chave in sorted(chaves):
+        caminho = os.path.join(pasta_publicada(chave, base_path), "regiao.json")
+        if os.path.isfile(caminho):
+            with open(caminho, encoding="utf-8") as f:
+                regioes[chave] = json.load(f)
+    return regioes
+
+
+def pasta_publicada(regiao=REGIAO_PADRAO, base_path=BASE_PATH):
+    """Caminho real da versão publicada da região: o arquivo <regiao>.versao, se existir, ou o link artifacts/<regiao>."""
+    ponteiro = os.path.join(base_path, regiao + EXTENSAO_PONTEIRO)
+    try:
+        with open(ponteiro, encoding="utf-8") as f:
+            return os.path.realpath(os.path.join(base_path, f.read().strip()))
+    except FileNotFoundError:
+        return os.path.realpath(os.path.join(base_path, regiao))
+
+
+def assinatura_artefatos(base_path=BASE_PATH):
+    """Retorna uma tupla (nome, mtime, tamanho) de cada arquivo da pasta de artefatos."""
+    entradas = []
+    with os.scandir(base_path) as it:
+        for entrada in it:
+            if entrada.is_file():
+                info = entrada.stat()
+                entradas.append((entrada.name, info.st_mtime_ns, info.st_size))
+    return tuple(sorted(entradas))
+
+
+def _ler_recomendacoes(base_path, n_usuarios):
+    """Tabela de recomendação pré-calculada por (usuário, estação), ou None em bundles sem ela.
+
+    Retorna {estacao: (species_id de todos os usuários em sequência, início da faixa de cada linha do índice)}.
+    """
+    caminho = os.path.join(base_path, "recomendacoes.parquet")
+    if not os.path.exists(caminho):
+        return None
+
+    recomendacoes = pd.read_parquet(caminho)
+    por_usuario = {}
+    for estacao in ESTACOES:
+        da_estacao = recomendacoes[recomendacoes["estacao"] == estacao]
+        linhas = da_estacao["linha_usuario"].to_numpy()
+        inicio = np.searchsorted(linhas, np.arange(n_usuarios + 1))
+        por_usuario[estacao] = (da_estacao["species_id"].to_numpy(dtype=np.int32), inicio)
+
+    return {"top_n": TOP_N_PRECALCULADO, "por_usuario": por_usuario}
+
+
+def _ler_artefatos(base_path):
+    with open(os.path.join(base_path, "regiao.json"), encoding="utf-8") as f:
+        regiao = json.load(f)
+    perfil_cluster = pd.read_parquet(os.path.join(base_path, "perfil_especies_cluster.parquet"))
+    vocabulario = pd.read_parquet(os.path.join(base_path, "vocabulario_especies.parquet")).set_index("species_id")
+    mat_cluster_especie = pd.read_csv(os.path.join(base_path, "mat_cluster_especie.csv"), index_col=0)
+    mat_cluster_especie.columns = mat_cluster_especie.columns.astype(np.int32)
+    sim_clusters = pd.read_csv(os.path.join(base_path, "sim_clusters.csv"), index_col=0)
+    sim_clusters.columns = sim_clusters.columns.astype(int)
+
+    if -1 in mat_cluster_especie.index:
+        mat_cluster_especie = mat_cluster_especie.drop(-1)
+
+    # Linhas com norma 1, transposta (espécies × clusters): a similaridade de cosseno do
+    # caso cluster -1 vira um produto esparso perfil @ matriz, sem normalizar a cada pedido
+    mat_cluster_normalizada = mat_cluster_especie.to_numpy(dtype=np.float64)
+    if len(mat_cluster_normalizada):
+        mat_cluster_normalizada = normalize(mat_cluster_normalizada)
+    mat_cluster_normalizada = np.ascontiguousarray(mat_cluster_normalizada.T)
+
+    # Índice de usuários: login -> cluster, posição média e bitset de espécies vistas
+    indice_usuarios = pd.read_parquet(os.path.join(base_path, "indice_usuarios.parquet"))
+    n_bytes = (len(vocabulario) + 7) // 8
+    bits_vistas = np.frombuffer(b"".join(indice_usuarios["especies_vistas"]), dtype=np.uint8)
+    bits_vistas = bits_vistas.reshape(len(indice_usuarios), n_bytes)
+    indice_usuarios = indice_usuarios.drop(columns="especies_vistas").set_index("user_login")
+
+    # Conjuntos imutáveis de espécies em alta por estação, escolhidos por estacao_atual() a cada pedido
+    estacoes_especies = pd.read_parquet(os.path.join(base_path, "estacoes_especies.parquet"))
+    especies_em_alta = {
+        estacao: frozenset(estacoes_especies.loc[estacoes_especies[estacao], "species_id"].tolist())
+        for estacao in ESTACOES
+    }
+
+    # Ranking de popularidade: "Geral" e uma lista por estação com só as espécies em alta
+    ranking = pd.read_parquet(os.path.join(base_path, "ranking_popularidade.parquet"))
+    # Estação sem nenhuma espécie em alta não aparece no arquivo e fica com a lista vazia
+    populares = {escopo: np.empty(0, dtype=np.int32) for escopo in ["Geral"] + ESTACOES}
+    populares.update({
+        escopo: grupo["species_id"].to_numpy(dtype=np.int32)
+        for escopo, grupo in ranking.groupby("escopo", sort=False)
+    })
+
+    # Índice espacial por espécie: só as coordenadas (memory-mapped) e as faixas de cada célula
+    pontos = feather.read_table(os.path.join(base_path, "indice_espacial_pontos.feather"), memory_map=True)
+    celulas = pd.read_parquet(os.path.join(base_path, "indice_espacial_celulas.parquet"))
+    indice_espacial = {
+        "tamanho_celula": TAMANHO_CELULA,
+        "latitude": pontos.column("latitude").to_numpy(),
+        "longitude": pontos.column("longitude").to_numpy(),
+        "celulas": {coluna: celulas[coluna].to_numpy() for coluna in celulas.columns},
+    }
+
+    # Grade de densidade célula × espécie (abundância local) e o centro de cada célula
+    celulas_densidade = pd.read_parquet(os.path.join(base_path, "densidade_celulas.parquet"))
+    densidade = {
+        "matriz": sp.load_npz(os.path.join(base_path, "densidade_especies.npz")).tocsr(),
+        "latitude": (celulas_densidade["linha"].to_numpy() + 0.5) * TAMANHO_CELULA - 90.0,
+        "longitude": (celulas_densidade["coluna"].to_numpy() + 0.5) * TAMANHO_CELULA - 180.0,
+    }
+
+    return {
+        "regiao": regiao,
+        "perfil_cluster": perfil_cluster,
+        "mat_cluster_especie": mat_cluster_especie,
+        "mat_cluster_normalizada": mat_cluster_normalizada,
+        "sim_clusters": sim_clusters,
+        "indice_usuarios": indice_usuarios,
+        "bits_vistas": bits_vistas,
+        "vocabulario": vocabulario,
+        "especies_em_alta": especies_em_alta,
+        "populares": populares,
+        "indice_espacial": indice_espacial,
+        "densidade": densidade,
+        "recomendacoes": _ler_recomendacoes(base_path, len(indice_usuarios)),
+    }
+
+
+def carregar_artefatos(regiao=REGIAO_PADRAO, base_path=BASE_PATH):
+    """Retorna o dicionário de artefatos da região compartilhado pelo processo, ou None se faltarem arquivos.
+
+    Os objetos retornados são compartilhados entre sessões e não devem ser modificados.
+    """
+    pasta_regiao = os.path.join(base_path, regiao)
+    # artifacts/<regiao> aponta a versão publicada; resolvido uma vez, todos os arquivos
+    # são lidos da mesma versão mesmo que o link seja trocado durante a leitura
+    base_path = pasta_publicada(regiao, base_path)
+    try:
+        assinatura = (base_path, assinatura_artefatos(base_path))
+    except FileNotFoundError:
+        return None
+
+    with _lock:
+        em_cache = _cache.get(pasta_regiao)
+        if em_cache is not None and em_cache[0] == assinatura:
+            return em_cache[1]
+
+        try:
+            artefatos = _ler_artefatos(base_path)
+        except FileNotFoundError:
+            return None
+
+        _cache[pasta_regiao] = (assinatura, artefatos)
+        return artefatos
@@ -0,0 +1,169 @@
+# Índice espacial por espécie para a busca de avistamentos próximos ("Onde encontrar?").
+#
+# As observações são agrupadas numa grade regular de TAMANHO_CELULA graus e
+# ordenadas por (species_id, linha, coluna): cada espécie ocupa uma faixa
+# contígua de células, e cada célula uma faixa contígua de pontos. Uma consulta
+# de raio só calcula distâncias para os pontos das células que a caixa do raio
+# toca, sem copiar nem varrer as observações das outras espécies.
+#
+# O índice é construído pelo Notebooks/prepare_data_app.py (construir_indice_espacial)
+# e lido pelo artefatos.py.
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+TAMANHO_CELULA = 0.05  # graus (~5,5 km de latitude)
+RAIO_KM = 50
+KM_POR_GRAU = 111.32
+
+# Abundância local: grade célula × espécie com o nº de registros (CSR float32),
+# somada com peso gaussiano nas células a até RAIO_ABUNDANCIA_KM do usuário
+RAIO_ABUNDANCIA_KM = 10
+
+# Mapa "Onde encontrar?": os avistamentos são agregados no servidor em no máximo
+# MAX_CELULAS_MAPA células, então o HTML enviado ao navegador não cresce com a
+# popularidade da espécie.
+ZOOM_MAPA = 10
+MAX_CELULAS_MAPA = 300
+PIXELS_CELULA = 32
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    R = 6371
+    lat1, lon1, lat2, lon2 = map(np.radians, [lat1, lon1, lat2, lon2])
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = np.sin(dlat/2)**2 + np.cos(lat1)*np.cos(lat2)*np.sin(dlon/2)**2
+    c = 2*np.arcsin(np.sqrt(a))
+    return R*c
+
+
+def celula(lat, lon, tamanho=TAMANHO_CELULA):
+    """Retorna (linha, coluna) da célula da grade que contém cada ponto."""
+    linha = np.floor((np.asarray(lat, dtype=float) + 90.0) / tamanho).astype(np.int32)
+    coluna = np.floor((np.asarray(lon, dtype=float) + 180.0) / tamanho).astype(np.int32)
+    return linha, coluna
+
+
+def construir_indice_espacial(species_id, latitude, longitude, tamanho=TAMANHO_CELULA):
+    """Constrói o índice a partir das colunas de observações.
+
+    Retorna (pontos, celulas):
+      pontos  -> DataFrame [species_id, latitude, longitude] ordenado por (species_id, linha, coluna)
+      celulas -> DataFrame [species_id, linha, coluna, inicio, fim] com a faixa de linhas de cada célula em pontos
+    """
+    species_id = np.asarray(species_id, dtype=np.int32)
+    latitude = np.asarray(latitude, dtype=float)
+    longitude = np.asarray(longitude, dtype=float)
+    linha, coluna = celula(latitude, longitude, tamanho)
+
+    ordem = np.lexsort((coluna, linha, species_id))
+    species_id, linha, coluna = species_id[ordem], linha[ordem], coluna[ordem]
+    pontos = pd.DataFrame({
+        'species_id': species_id,
+        'latitude': latitude[ordem],
+        'longitude': longitude[ordem],
+    })
+
+    nova_celula = np.r_[True, (species_id[1:] != species_id[:-1]) | (linha[1:] != linha[:-1]) | (coluna[1:] != coluna[:-1])]
+    inicio = np.flatnonzero(nova_celula)
+    celulas = pd.DataFrame({
+        'species_id': species_id[inicio],
+        'linha': linha[inicio],
+        'coluna': coluna[inicio],
+        'inicio': inicio.astype(np.int64),
+        'fim': np.r_[inicio[1:], len(ordem)].astype(np.int64),
+    })
+    return pontos, celulas
+
+
+def construir_grade_densidade(species_id, latitude, longitude, n_especies, tamanho=TAMANHO_CELULA):
+    """Grade de densidade: (matriz CSR float32 células × espécies com o nº de registros, DataFrame [linha, coluna] das células)."""
+    linha, coluna = celula(latitude, longitude, tamanho)
+    chave = linha.astype(np.int64) * (int(360.0 / tamanho) + 2) + coluna
+    _, primeira, codigo_celula = np.unique(chave, return_index=True, return_inverse=True)
+
+    matriz = sp.csr_matrix(
+        (np.ones(len(codigo_celula), dtype=np.float32), (codigo_celula, np.asarray(species_id))),
+        shape=(len(primeira), n_especies),
+    )
+    matriz.sum_duplicates()
+    celulas = pd.DataFrame({'linha': linha[primeira], 'coluna': coluna[primeira]})
+    return matriz, celulas
+
+
+def abundancia_local(densidade, lat, lon, raio_km=RAIO_ABUNDANCIA_KM):
+    """Fração esperada de registros de cada espécie em torno de (lat, lon) -> array float32 sobre o vocabulário.
+
+    Percorre só o vetor de centros de célula (O(células)); as células a até raio_km
+    entram com peso gaussiano pela distância. Sem células no raio, tudo é zero.
+    """
+    matriz = densidade['matriz']
+    distancias = haversine(lat, lon, densidade['latitude'], densidade['longitude'])
+    perto = np.flatnonzero(distancias <= raio_km)
+    if len(perto) == 0:
+        return np.zeros(matriz.shape[1], dtype=np.float32)
+
+    pesos = np.exp(-0.5 * (distancias[perto] / (raio_km / 2)) ** 2).astype(np.float32)
+    contagens = np.asarray(pesos @ matriz[perto]).ravel()
+    return contagens / max(contagens.sum(), np.float32(1e-12))
+
+
+def avistamentos_proximos(indice, species_id, lat, lon, raio_km=RAIO_KM):
+    """Retorna um DataFrame [latitude, longitude, distance] dos avistamentos da espécie a até raio_km de (lat, lon)."""
+    celulas = indice['celulas']
+    tamanho = indice['tamanho_celula']
+
+    # Faixa de células da espécie (celulas está ordenado por species_id)
+    a, b = np.searchsorted(celulas['species_id'], [species_id, species_id + 1])
+
+    # Caixa que contém o círculo do raio; a largura em longitude usa o cosseno da borda mais próxima do polo
+    dlat = raio_km / KM_POR_GRAU
+    dlon = raio_km / (KM_POR_GRAU * max(np.cos(np.radians(min(abs(lat) + dlat, 89.9))), 1e-6))
+    linha_min, coluna_min = celula(lat - dlat, lon - dlon, tamanho)
+    linha_max, coluna_max = celula(lat + dlat, lon + dlon, tamanho)
+
+    linhas, colunas = celulas['linha'][a:b], celulas['coluna'][a:b]
+    perto = (linhas >= linha_min) & (linhas <= linha_max) & (colunas >= coluna_min) & (colunas <= coluna_max)
+    faixas = zip(celulas['inicio'][a:b][perto], celulas['fim'][a:b][perto])
+    posicoes = np.concatenate([np.arange(inicio, fim) for inicio, fim in faixas] or [np.empty(0, dtype=np.int64)])
+
+    latitudes = indice['latitude'][posicoes]
+    longitudes = indice['longitude'][posicoes]
+    distancias = haversine(lat, lon, latitudes, longitudes)
+    dentro = distancias <= raio_km
+    return pd.DataFrame({
+        'latitude': latitudes[dentro],
+        'longitude': longitudes[dentro],
+        'distance': distancias[dentro],
+    })
+
+
+def agregar_pontos(latitude, longitude, zoom=ZOOM_MAPA, max_celulas=MAX_CELULAS_MAPA):
+    """Agrupa os pontos em células de ~PIXELS_CELULA pixels no zoom pedido.
+
+    Retorna um DataFrame [latitude, longitude, n] com o centróide e a contagem de
+    cada célula. Se houver mais de max_celulas células, o tamanho da célula é
+    dobrado até caber no limite.
+    """
+    latitude = np.asarray(latitude, dtype=float)
+    longitude = np.asarray(longitude, dtype=float)
+    if len(latitude) == 0:
+        return pd.DataFrame({'latitude': latitude, 'longitude': longitude, 'n': np.empty(0, dtype=np.int64)})
+
+    # Um tile de 256 px cobre 360 / 2**zoom graus de longitude
+    tamanho = 360.0 / 2 ** zoom / 256 * PIXELS_CELULA
+    while True:
+        linha, coluna = celula(latitude, longitude, tamanho)
+        chave = linha.astype(np.int64) * (int(360.0 / tamanho) + 2) + coluna
+        _, inverso, n = np.unique(chave, return_inverse=True, return_counts=True)
+        if len(n) <= max_celulas:
+            break
+        tamanho *= 2
+
+    return pd.DataFrame({
+        'latitude': np.bincount(inverso, weights=latitude) / n,
+        'longitude': np.bincount(inverso, weights=longitude) / n,
+        'n': n,
+    })
@@ -0,0 +1,39 @@
+# Mapa "Onde encontrar?" do app.py.
+#
+# Os avistamentos próximos chegam agregados em células (espacial.agregar_pontos):
+# o mapa tem no máximo MAX_CELULAS_MAPA elementos, qualquer que seja a
+# popularidade da espécie. A construção fica fora do app.py para que os
+# benchmarks meçam o mesmo código que a página executa.
+
+import folium
+import numpy as np
+from folium.plugins import HeatMap
+
+from espacial import agregar_pontos, ZOOM_MAPA
+
+MODOS_MAPA = ["Pontos agrupados", "Mapa de calor"]
+
+
+def construir_mapa(locais, lat, lon, modo=MODOS_MAPA[0]):
+    """Retorna o folium.Map centrado em (lat, lon) com os avistamentos de `locais` [latitude, longitude]."""
+    mapa = folium.Map(location=[lat, lon], zoom_start=ZOOM_MAPA)
+    folium.Marker(
+        [lat, lon],
+        popup="Sua posição média",
+        icon=folium.Icon(color='blue', icon='user', prefix='fa')
+    ).add_to(mapa)
+
+    # Avistamentos agregados em células: o número de elementos do mapa é limitado
+    celulas = agregar_pontos(locais['latitude'], locais['longitude'])
+    if modo == "Mapa de calor":
+        HeatMap(celulas[['latitude', 'longitude', 'n']].values.tolist(), radius=20).add_to(mapa)
+    else:
+        raio_max = np.sqrt(celulas['n'].max())
+        for lat_celula, lon_celula, n in celulas[['latitude', 'longitude', 'n']].itertuples(index=False):
+            folium.CircleMarker(
+                [lat_celula, lon_celula],
+                radius=4 + 12 * np.sqrt(n) / raio_max,
+                color='red', fill=True, fill_opacity=0.6,
+                tooltip=f"{int(n)} avistamento(s)"
+            ).add_to(mapa)
+    return mapa
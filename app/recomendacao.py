@@ -0,0 +1,366 @@
+# Lógica de recomendação do BirdedexGO (sem dependência do Streamlit).
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from datetime import datetime
+
+from espacial import abundancia_local
+from regioes import estacao_do_mes
+
+# Candidatas reordenadas pela abundância local no modo "perto de mim"
+CANDIDATOS_LOCAL = 20
+# Tamanho das listas gravadas pelo prepare_data_app.py em recomendacoes.parquet; cobre as
+# candidatas do "perto de mim" (as listas de top_n menor são prefixos das mais longas)
+TOP_N_PRECALCULADO = CANDIDATOS_LOCAL
+
+
+# --- FUNÇÕES AUXILIARES ---
+def estacao_atual(hemisferio='sul'):
+    return estacao_do_mes(datetime.now().month, hemisferio)
+
+
+def buscar_usuario(usuario_login, artefatos):
+    """Consulta O(1) no índice de usuários; retorna None para logins sem observações."""
+    indice = artefatos['indice_usuarios']
+    try:
+        pos = indice.index.get_loc(usuario_login)
+    except KeyError:
+        return None
+
+    linha = indice.iloc[pos]
+    bits = np.unpackbits(artefatos['bits_vistas'][pos], count=len(artefatos['vocabulario']))
+    return {
+        'posicao': pos,
+        'cluster': int(linha['cluster']),
+        'latitude': float(linha['lat_media']),
+        'longitude': float(linha['lon_media']),
+        'vistas': frozenset(np.flatnonzero(bits).tolist()),
+    }
+
+
+def similaridade_clusters(vistas, artefatos):
+    """Similaridade de cosseno entre perfis binários (CSR usuários × espécies) e os clusters.
+
+    A matriz cluster × espécie já vem com linhas de norma 1 (normalizada na carga),
+    então basta um produto esparso e a divisão pela norma de cada perfil.
+    """
+    n_vistas = np.diff(vistas.indptr)
+    return (vistas @ artefatos['mat_cluster_normalizada']) / np.sqrt(np.maximum(n_vistas, 1))[:, None]
+
+
+def mensagem_recomendacao(usuario, artefatos):
+    """Mensagem exibida acima das recomendações, conforme o caso do usuário (None = novo usuário)."""
+    nome_regiao = artefatos['regiao']['nome']
+    if usuario is None:
+        return f"Bem-vindo(a)! Parece que você é um novo Mestre. Aqui estão as aves mais populares de {nome_regiao}:"
+    if usuario['cluster'] == -1:
+        if not usuario['vistas'] or artefatos['mat_cluster_especie'].empty:
+            return f"Bem-vindo(a)! Aqui estão as aves mais populares de {nome_regiao}:"
+        return "Seu perfil é único! Buscamos aves de clusters semelhantes ao seu."
+    return f"Radar (Cluster {usuario['cluster']}): Detectamos estas aves para o seu perfil!"
+
+
+# --- LÓGICA DE RECOMENDAÇÃO ---
+def consultar_recomendacoes(usuario_login, artefatos, top_n=5):
+    """Retorna (mensagem, lista de species_id recomendados) a partir das tabelas pré-calculadas.
+
+    Usuários do índice e novos usuários são respondidos por consulta às tabelas
+    geradas pelo prepare_data_app.py; recomendar_aves só é chamado quando o
+    bundle não tem as tabelas ou quando top_n passa do que foi pré-calculado.
+    """
+    if not _tem_tabelas(artefatos, top_n):
+        return recomendar_aves(usuario_login, artefatos, top_n=top_n)
+    return _consultar_tabelas(buscar_usuario(usuario_login, artefatos), artefatos, top_n)
+
+
+def _tem_tabelas(artefatos, top_n):
+    """Se o bundle tem as recomendações pré-calculadas com pelo menos top_n espécies por usuário."""
+    tabelas = artefatos.get('recomendacoes')
+    return tabelas is not None and top_n <= tabelas['top_n']
+
+
+def _consultar_tabelas(usuario, artefatos, top_n):
+    """Consulta às tabelas pré-calculadas para o resultado de buscar_usuario (None = novo usuário)."""
+    estacao = estacao_atual(artefatos['regiao']['hemisferio'])
+    if usuario is None:
+        return mensagem_recomendacao(None, artefatos), populares_da_estacao(artefatos, estacao, top_n)
+
+    especies, inicio = artefatos['recomendacoes']['por_usuario'][estacao]
+    pos = usuario['posicao']
+    return mensagem_recomendacao(usuario, artefatos), especies[inicio[pos]:inicio[pos + 1]][:top_n].tolist()
+
+
+def recomendar_perto_de_mim(usuario_login, artefatos, top_n=5, candidatos=CANDIDATOS_LOCAL):
+    """Como consultar_recomendacoes, mas reordena as `candidatos` primeiras pela abundância local.
+
+    As candidatas saem da tabela pré-calculada (até TOP_N_PRECALCULADO). A abundância vem da grade de densidade, na posição média do usuário (ou no
+    centro da região para novos usuários); empates mantêm a ordem original.
+    """
+    usuario = buscar_usuario(usuario_login, artefatos)
+    if _tem_tabelas(artefatos, candidatos):
+        mensagem, especies = _consultar_tabelas(usuario, artefatos, candidatos)
+    else:
+        mensagem, especies = recomendar_aves(usuario_login, artefatos, top_n=candidatos)
+    if not especies:
+        return mensagem, especies
+
+    if usuario is None:
+        lat, lon = artefatos['regiao']['centro']
+    else:
+        lat, lon = usuario['latitude'], usuario['longitude']
+
+    abundancia = abundancia_local(artefatos['densidade'], lat, lon)
+    ordem = np.argsort(-abundancia[np.asarray(especies)], kind='stable')
+    return mensagem, [especies[i] for i in ordem[:top_n]]
+
+
+def recomendar_aves(usuario_login, artefatos, top_n=5, min_recomendacoes=3):
+    """Retorna (mensagem, lista de species_id recomendados), calculados na hora."""
+    regiao = artefatos['regiao']
+    perfil_cluster = artefatos['perfil_cluster']
+    mat_cluster_especie = artefatos['mat_cluster_especie']
+    sim_clusters = artefatos['sim_clusters']
+
+    usuario = buscar_usuario(usuario_login, artefatos)
+    vistas = set() if usuario is None else usuario['vistas']
+
+    # --- Filtro sazonal ---
+    estacao = estacao_atual(regiao['hemisferio'])
+    especies_em_alta = artefatos['especies_em_alta'][estacao]
+
+    # --- Novo usuário ---
+    if usuario is None:
+        mensagem = mensagem_recomendacao(None, artefatos)
+        return mensagem, populares_da_estacao(artefatos, estacao, top_n)
+
+    # --- Usuário com cluster definido ---
+    cluster_usuario = usuario['cluster']
+
+    # --- Caso cluster -1 ---
+    if cluster_usuario == -1:
+        # Sem espécies vistas, ou região ainda sem clusters para comparar: aves populares
+        if not vistas or mat_cluster_especie.empty:
+            mensagem = mensagem_recomendacao(usuario, artefatos)
+            populares = artefatos['populares'][estacao]
+            recomendacoes_finais = [esp for esp in populares.tolist() if esp not in vistas]
+            return mensagem, recomendacoes_finais[:top_n]
+
+        # Usuário com poucas observações, faz recomendação baseada em similaridade
+        mensagem = mensagem_recomendacao(usuario, artefatos)
+        # Perfil do usuário como vetor esparso de índices (as colunas da matriz são os species_id)
+        colunas = np.fromiter(sorted(vistas), dtype=np.int64)
+        perfil_usuario = sp.csr_matrix(
+            (np.ones(len(colunas)), colunas, [0, len(colunas)]),
+            shape=(1, len(artefatos['vocabulario']))
+        )
+        scores = similaridade_clusters(perfil_usuario, artefatos)[0]
+
+        ordem = np.argsort(-scores, kind='stable')[:3]
+        top_clusters_similares = zip(mat_cluster_especie.index[ordem], scores[ordem])
+
+        especie_scores = {}
+        for cluster, score_cluster in top_clusters_similares:
+            lista = perfil_cluster[perfil_cluster['cluster'] == cluster]['especies_mais_comuns']
+            if not lista.empty:
+                for esp in lista.iloc[0]:
+                    especie_scores[esp] = especie_scores.get(esp, 0) + score_cluster
+
+        especie_scores = {
+            esp: sc for esp, sc in especie_scores.items()
+            if esp not in vistas and esp in especies_em_alta
+        }
+
+        recomendadas = sorted(especie_scores.items(), key=lambda x: x[1], reverse=True)
+        recomendacoes_finais = [esp for esp, _ in recomendadas]
+
+        return mensagem, recomendacoes_finais[:top_n]
+
+    # --- Caso cluster válido ---
+    mensagem = mensagem_recomendacao(usuario, artefatos)
+    lista_cluster = perfil_cluster[perfil_cluster['cluster'] == cluster_usuario]['especies_mais_comuns']
+    especies_cluster = [] if lista_cluster.empty else lista_cluster.iloc[0]
+
+    sugestoes = [esp for esp in especies_cluster if esp not in vistas and esp in especies_em_alta]
+
+    recomendacoes_finais = list(sugestoes)
+
+    # --- Fallback ---
+    if len(recomendacoes_finais) < min_recomendacoes:
+        similares = sim_clusters.loc[cluster_usuario].sort_values(ascending=False)
+        similares = similares[similares.index != cluster_usuario]
+        top_vizinhos = similares.head(3).index.tolist()
+
+        especie_scores_fallback = {}
+
+        for cluster_v in top_vizinhos:
+            score_cluster = float(sim_clusters.loc[cluster_usuario, cluster_v])
+            lista_v = perfil_cluster[perfil_cluster['cluster'] == cluster_v]['especies_mais_comuns']
+
+            if not lista_v.empty:
+                for esp in lista_v.iloc[0]:
+                    especie_scores_fallback[esp] = especie_scores_fallback.get(esp, 0) + score_cluster
+
+        sugestoes_fallback = sorted(especie_scores_fallback.items(), key=lambda x: x[1], reverse=True)
+
+        for esp, _ in sugestoes_fallback:
+            if len(recomendacoes_finais) >= top_n:
+                break
+            if esp not in recomendacoes_finais and esp not in vistas and esp in especies_em_alta:
+                recomendacoes_finais.append(esp)
+
+    return mensagem, recomendacoes_finais[:top_n]
+
+
+# --- RECOMENDAÇÃO EM LOTE ---
+# Mesmas regras de recomendar_aves, aplicadas a todos os usuários do índice de
+# uma vez com operações matriciais:
+#   vistas   -> matriz esparsa usuário × espécie (CSR)
+#   perfis   -> matriz cluster × posição com os species_id do perfil (-1 = vazio)
+#   estação  -> máscara booleana sobre o vocabulário
+# Os desempates seguem a ordem da versão por usuário (ordenação estável).
+
+def matriz_vistas(artefatos, bloco=8192):
+    """Matriz CSR booleana usuário × espécie construída a partir dos bitsets do índice."""
+    bits = artefatos['bits_vistas']
+    n_especies = len(artefatos['vocabulario'])
+    linhas, colunas = [], []
+    for inicio in range(0, len(bits), bloco):
+        linha, coluna = np.nonzero(np.unpackbits(bits[inicio:inicio + bloco], axis=1, count=n_especies))
+        linhas.append(linha + inicio)
+        colunas.append(coluna)
+    linhas = np.concatenate(linhas) if linhas else np.empty(0, dtype=np.int64)
+    colunas = np.concatenate(colunas) if colunas else np.empty(0, dtype=np.int64)
+    return sp.csr_matrix(
+        (np.ones(len(linhas), dtype=bool), (linhas, colunas)), shape=(len(bits), n_especies)
+    )
+
+
+def _validas(candidatas, linhas_usuarios, bits, em_alta):
+    """Máscara das candidatas (usuários × posições) não vistas pelo usuário e em alta na estação."""
+    ok = candidatas >= 0
+    c = np.where(ok, candidatas, 0)
+    vista = bits[linhas_usuarios[:, None], c // 8] & (128 >> (c % 8)).astype(np.uint8)
+    return ok & (vista == 0) & em_alta[c]
+
+
+def _pontuar_clusters(perfis, posicoes, scores, n_especies):
+    """Soma, por linha, o score de cada cluster escolhido a cada espécie do seu perfil.
+
+    posicoes/scores -> (n, k) com as linhas de perfis e o score de cada cluster.
+    Retorna (linha, species_id, score) ordenado por linha, score decrescente e
+    ordem da primeira aparição (a ordem de inserção do dicionário em recomendar_aves).
+    """
+    n, k = posicoes.shape
+    candidatas = perfis[posicoes].reshape(n, -1)
+    scores = np.repeat(scores, perfis.shape[1], axis=1)
+    linha = np.repeat(np.arange(n), candidatas.shape[1])
+    ok = candidatas.ravel() >= 0
+
+    chave = linha[ok].astype(np.int64) * n_especies + candidatas.ravel()[ok]
+    chave_unica, primeira, inverso = np.unique(chave, return_index=True, return_inverse=True)
+    soma = np.bincount(inverso, weights=scores.ravel()[ok])
+
+    linha, especie = np.divmod(chave_unica, n_especies)
+    ordem = np.lexsort((primeira, -soma, linha))
+    return linha[ordem], especie[ordem], soma[ordem]
+
+
+def _primeiras_validas(validas, top_n):
+    """(linha, coluna) das primeiras top_n posições válidas de cada linha, em ordem."""
+    return np.nonzero(validas & (np.cumsum(validas, axis=1) <= top_n))
+
+
+def recomendar_em_lote(artefatos, estacao=None, top_n=5, min_recomendacoes=3):
+    """Recomendações de todos os usuários do índice.
+
+    Retorna um DataFrame [user_login, posicao, species_id] (posicao começa em 1),
+    com as mesmas listas que recomendar_aves devolveria para cada login na estação
+    pedida (estação atual da região quando estacao=None).
+    """
+    indice = artefatos['indice_usuarios']
+    bits = artefatos['bits_vistas']
+    n_especies = len(artefatos['vocabulario'])
+    mat_cluster_especie = artefatos['mat_cluster_especie']
+    sim_clusters = artefatos['sim_clusters']
+
+    if estacao is None:
+        estacao = estacao_atual(artefatos['regiao']['hemisferio'])
+    em_alta = np.zeros(n_especies, dtype=bool)
+    em_alta[list(artefatos['especies_em_alta'][estacao])] = True
+
+    # Perfis de todos os clusters conhecidos numa matriz; a última linha fica vazia (cluster sem perfil)
+    perfil = artefatos['perfil_cluster'].set_index('cluster')['especies_mais_comuns']
+    clusters = np.unique(np.r_[perfil.index, sim_clusters.index, mat_cluster_especie.index].astype(np.int64))
+    largura = max([len(lista) for lista in perfil] + [1])
+    perfis = np.full((len(clusters) + 1, largura), -1, dtype=np.int64)
+    for cluster, lista in perfil.items():
+        perfis[np.searchsorted(clusters, cluster), :len(lista)] = lista
+
+    cluster_usuario = indice['cluster'].to_numpy(dtype=np.int64)
+    resultados = []  # (linhas dos usuários, species_id) na ordem de recomendação
+
+    # --- Caso cluster válido: perfil do cluster, completado pelos vizinhos se faltar ---
+    for cluster in np.unique(cluster_usuario[cluster_usuario != -1]):
+        linhas_usuarios = np.flatnonzero(cluster_usuario == cluster)
+        proprias = perfis[np.searchsorted(clusters, cluster)]
+
+        fallback = np.empty(0, dtype=np.int64)
+        if cluster in sim_clusters.index:
+            similares = sim_clusters.loc[cluster].drop(cluster)
+            ordem = np.argsort(-similares.to_numpy(), kind='stable')[:3]
+            _, especies_fallback, _ = _pontuar_clusters(
+                perfis,
+                np.searchsorted(clusters, similares.index.to_numpy()[ordem])[None, :],
+                similares.to_numpy()[ordem][None, :],
+                n_especies,
+            )
+            fallback = especies_fallback[~np.isin(especies_fallback, proprias)]
+
+        candidatas = np.r_[proprias, fallback]
+        validas = _validas(np.broadcast_to(candidatas, (len(linhas_usuarios), len(candidatas))), linhas_usuarios, bits, em_alta)
+        sem_fallback = validas[:, :len(proprias)].sum(axis=1) >= min_recomendacoes
+        validas[sem_fallback, len(proprias):] = False
+
+        linha, coluna = _primeiras_validas(validas, top_n)
+        resultados.append((linhas_usuarios[linha], candidatas[coluna]))
+
+    # --- Caso cluster -1: similaridade de cosseno entre as espécies vistas e os clusters ---
+    linhas_usuarios = np.flatnonzero(cluster_usuario == -1)
+    if len(linhas_usuarios) and mat_cluster_especie.empty:
+        # Região sem clusters: aves populares ainda não vistas
+        populares = artefatos['populares'][estacao].astype(np.int64)
+        validas = _validas(np.broadcast_to(populares, (len(linhas_usuarios), len(populares))), linhas_usuarios, bits, em_alta)
+        linha, coluna = _primeiras_validas(validas, top_n)
+        resultados.append((linhas_usuarios[linha], populares[coluna]))
+    elif len(linhas_usuarios):
+        vistas = matriz_vistas(artefatos)[linhas_usuarios].astype(np.float64)
+        similaridade = similaridade_clusters(vistas, artefatos)
+
+        ordem = np.argsort(-similaridade, axis=1, kind='stable')[:, :3]
+        posicoes = np.searchsorted(clusters, mat_cluster_especie.index.to_numpy(dtype=np.int64)[ordem])
+        linha, especie, _ = _pontuar_clusters(
+            perfis, posicoes, np.take_along_axis(similaridade, ordem, axis=1), n_especies
+        )
+
+        valida = _validas(especie[:, None], linhas_usuarios[linha], bits, em_alta)[:, 0]
+        linha, especie = linha[valida], especie[valida]
+        inicio_grupo = np.searchsorted(linha, linha)
+        manter = np.arange(len(linha)) - inicio_grupo < top_n
+        resultados.append((linhas_usuarios[linha[manter]], especie[manter]))
+
+    linhas = np.concatenate([r[0] for r in resultados] or [np.empty(0, dtype=np.int64)])
+    especies = np.concatenate([r[1] for r in resultados] or [np.empty(0, dtype=np.int64)])
+    ordem = np.argsort(linhas, kind='stable')
+    linhas, especies = linhas[ordem], especies[ordem]
+
+    return pd.DataFrame({
+        'user_login': indice.index.to_numpy()[linhas],
+        'posicao': (np.arange(len(linhas)) - np.searchsorted(linhas, linhas) + 1).astype(np.int16),
+        'species_id': especies.astype(np.int32),
+    })
+
+
+def populares_da_estacao(artefatos, estacao, top_n=5):
+    """Aves mais registradas na região e em alta na estação (recomendação para novos usuários)."""
+    return artefatos['populares'][estacao][:top_n].tolist()
@@ -0,0 +1,40 @@
+# Registro de regiões atendidas pelo BirdedexGO (app/regioes.json).
+#
+# Cada região tem uma chave (ex.: "sao_paulo") e define:
+#   nome       -> nome exibido no app
+#   bbox       -> {"lat_min", "lat_max", "lon_min", "lon_max"}
+#   poligono   -> opcional, lista de [lat, lon]; quando presente, refina o bbox
+#   centro     -> [lat, lon] usado como centro padrão do mapa
+#   hemisferio -> "sul" ou "norte", define as estações do ano
+
+import json
+import os
+
+REGIOES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "regioes.json")
+REGIAO_PADRAO = "sao_paulo"
+
+
+def carregar_regioes(path=REGIOES_PATH):
+    """Lê o registro de regiões, completando o bbox a partir do polígono quando necessário."""
+    with open(path, encoding="utf-8") as f:
+        regioes = json.load(f)
+
+    for regiao in regioes.values():
+        if "bbox" not in regiao:
+            lats = [p[0] for p in regiao["poligono"]]
+            lons = [p[1] for p in regiao["poligono"]]
+            regiao["bbox"] = {"lat_min": min(lats), "lat_max": max(lats), "lon_min": min(lons), "lon_max": max(lons)}
+        regiao.setdefault("hemisferio", "sul")
+    return regioes
+
+
+def estacao_do_mes(mes, hemisferio="sul"):
+    if hemisferio == "norte":
+        if mes in [12, 1, 2]: return 'Inverno'
+        elif mes in [3, 4, 5]: return 'Primavera'
+        elif mes in [6, 7, 8]: return 'Verão'
+        else: return 'Outono'
+    if mes in [12, 1, 2]: return 'Verão'
+    elif mes in [3, 4, 5]: return 'Outono'
+    elif mes in [6, 7, 8]: return 'Inverno'
+    else: return 'Primavera'
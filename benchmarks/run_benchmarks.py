@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+run_benchmarks.py
+Mede os caminhos quentes do app sobre bundles sintéticos de tamanhos crescentes.
+
+Casos medidos em cada tamanho (nº de observações):
+- carregar_artefatos_frio  -> leitura do bundle do disco (cache do processo vazio)
+- carregar_artefatos_cache -> chamada com o bundle já em memória (só a assinatura)
+- recomendar_aves          -> recomendação calculada na hora, usuários sorteados pela atividade
+- consultar_recomendacoes  -> recomendação pré-calculada (caminho padrão do app)
+- haversine                -> distância de um ponto a todas as observações
+- mapa_pontos / mapa_calor -> bloco "Onde encontrar?" do app.py: avistamentos_proximos,
+                              construir_mapa e o HTML do mapa
+
+Para cada caso: p50/p99/média em ms e o pico de memória alocada (tracemalloc)
+numa chamada. Arquivos mapeados em memória (Feather) não entram no pico.
+
+Os resultados vão para benchmarks/results/<data>.json; --comparar aponta um
+resultado anterior e marca como regressão os casos cujo p50 piorou além de --limite.
+
+Uso (na raiz do projeto):
+    python benchmarks/run_benchmarks.py --tamanhos 10k 100k 1m
+    python benchmarks/run_benchmarks.py --comparar benchmarks/results/<base>.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from synthetic import ROOT, build_bundle, default_sizes, generate_dataset
+
+import artefatos as artefatos_mod
+from artefatos import carregar_artefatos
+from espacial import avistamentos_proximos, haversine
+from mapa import MODOS_MAPA, construir_mapa
+from recomendacao import consultar_recomendacoes, recomendar_aves
+
+TAMANHOS = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000}
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+CHAVE = "sintetico"
+
+# Repetições por caso; a carga a frio relê o bundle inteiro a cada vez
+REPETICOES = 200
+REPETICOES_CARGA = 5
+REPETICOES_MEMORIA = 3
+FRACAO_USUARIOS_NOVOS = 0.05  # logins fora do índice (caminho de usuário novo)
+LIMITE_REGRESSAO = 1.25       # p50 novo / p50 base acima disso = regressão
+
+
+def medir(funcao, entradas):
+    """Tempo (ms) de funcao(entrada) para cada entrada; retorna o array de latências."""
+    tempos = np.empty(len(entradas))
+    for i, entrada in enumerate(entradas):
+        inicio = time.perf_counter()
+        funcao(entrada)
+        tempos[i] = (time.perf_counter() - inicio) * 1000
+    return tempos
+
+
+def pico_memoria(funcao, entradas):
+    """Maior pico de memória alocada (MB) em uma chamada de funcao, entre as entradas dadas."""
+    picos = []
+    tracemalloc.start()
+    try:
+        for entrada in entradas:
+            tracemalloc.reset_peak()
+            antes = tracemalloc.get_traced_memory()[0]
+            funcao(entrada)
+            picos.append(tracemalloc.get_traced_memory()[1] - antes)
+    finally:
+        tracemalloc.stop()
+    return max(picos) / 2**20
+
+
+def resumo(caso, tempos, pico_mb, info):
+    return {
+        "case": caso,
+        **info,
+        "repetitions": len(tempos),
+        "p50_ms": float(np.percentile(tempos, 50)),
+        "p99_ms": float(np.percentile(tempos, 99)),
+        "mean_ms": float(tempos.mean()),
+        "max_ms": float(tempos.max()),
+        "peak_mem_mb": pico_mb,
+    }
+
+
+def casos(base_path, observacoes, repeticoes, rng):
+    """Gera (nome, função, entradas de tempo, entradas de memória) para o bundle em base_path."""
+
+    def carga_fria(_):
+        artefatos_mod._cache.clear()
+        return carregar_artefatos(CHAVE, base_path)
+
+    artefatos = carga_fria(None)
+    assert artefatos is not None, f"bundle incompleto em {base_path}"
+
+    # Usuários sorteados pela atividade (como chegam as consultas), mais alguns logins novos
+    logins = observacoes["user_login"].to_numpy()
+    sorteados = logins[rng.integers(0, len(logins), repeticoes)].tolist()
+    n_novos = max(1, int(repeticoes * FRACAO_USUARIOS_NOVOS))
+    sorteados[:n_novos] = [f"desconhecido{i}" for i in range(n_novos)]
+    rng.shuffle(sorteados)
+
+    # Pontos de consulta em torno das observações; espécies sorteadas pela popularidade
+    pontos = rng.integers(0, len(observacoes), repeticoes)
+    lat = observacoes["latitude"].to_numpy()
+    lon = observacoes["longitude"].to_numpy()
+    # Uma entrada por avistamento do índice espacial: espécies populares saem mais vezes
+    celulas = artefatos["indice_espacial"]["celulas"]
+    species_id = np.repeat(celulas["species_id"], celulas["fim"] - celulas["inicio"])
+    consultas_mapa = list(zip(species_id[rng.integers(0, len(species_id), repeticoes)], lat[pontos], lon[pontos]))
+
+    def mapa(modo):
+        def bloco(consulta):
+            species_id, lat_usuario, lon_usuario = consulta
+            locais = avistamentos_proximos(artefatos["indice_espacial"], int(species_id), lat_usuario, lon_usuario)
+            if not locais.empty:
+                construir_mapa(locais, lat_usuario, lon_usuario, modo).get_root().render()
+        return bloco
+
+    carga = [None] * REPETICOES_CARGA
+    yield "carregar_artefatos_frio", carga_fria, carga, carga[:1]
+    # Deixa o bundle em cache para os casos seguintes
+    carga_fria(None)
+    yield "carregar_artefatos_cache", lambda _: carregar_artefatos(CHAVE, base_path), [None] * repeticoes, [None]
+    yield "recomendar_aves", lambda login: recomendar_aves(login, artefatos), sorteados, sorteados[:REPETICOES_MEMORIA]
+    yield "consultar_recomendacoes", lambda login: consultar_recomendacoes(login, artefatos), sorteados, sorteados[:REPETICOES_MEMORIA]
+    centros = list(zip(lat[pontos], lon[pontos]))[:min(repeticoes, 50)]
+    yield "haversine", lambda p: haversine(p[0], p[1], lat, lon), centros, centros[:1]
+    for nome, modo in zip(["mapa_pontos", "mapa_calor"], MODOS_MAPA):
+        yield nome, mapa(modo), consultas_mapa, consultas_mapa[:REPETICOES_MEMORIA]
+
+
+def rodar_tamanho(rotulo, n_obs, args, pasta_dados):
+    n_users, n_species = default_sizes(n_obs)
+    n_users = args.usuarios or n_users
+    n_species = args.especies or n_species
+    info = {
+        "size": rotulo,
+        "n_observations": n_obs,
+        "n_users": n_users,
+        "n_species": n_species,
+        "n_clusters": args.clusters,
+    }
+    print(f"\n=== {rotulo}: {n_obs:,} observações, {n_users:,} usuários, "
+          f"{n_species} espécies, {args.clusters} clusters ===", flush=True)
+
+    observacoes, clusters = generate_dataset(n_obs, n_users, n_species, args.clusters, seed=args.seed)
+    base_path = os.path.join(pasta_dados, rotulo)
+    output_dir = os.path.join(base_path, CHAVE)
+    # Com --dados, o bundle de uma execução anterior (mesmo tamanho) é reaproveitado
+    if not os.path.isfile(os.path.join(output_dir, "recomendacoes.parquet")):
+        shutil.rmtree(output_dir, ignore_errors=True)
+        inicio = time.perf_counter()
+        # As mensagens de progresso do prepare_data_app.py não entram na saída do benchmark
+        with contextlib.redirect_stdout(io.StringIO()):
+            build_bundle(observacoes, clusters, output_dir, CHAVE)
+        info["bundle_build_s"] = time.perf_counter() - inicio
+        print(f"  bundle gerado em {info['bundle_build_s']:.1f}s", flush=True)
+    info["bundle_mb"] = sum(
+        os.path.getsize(os.path.join(output_dir, f)) for f in os.listdir(output_dir)
+    ) / 2**20
+
+    rng = np.random.default_rng(args.seed)
+    resultados = []
+    for caso, funcao, entradas, entradas_memoria in casos(base_path, observacoes, args.repeticoes, rng):
+        tempos = medir(funcao, entradas)
+        pico = pico_memoria(funcao, entradas_memoria)
+        resultados.append(resumo(caso, tempos, pico, info))
+        print(f"  {caso:<26} p50 {resultados[-1]['p50_ms']:>10.3f} ms   p99 {resultados[-1]['p99_ms']:>10.3f} ms"
+              f"   pico {pico:>9.2f} MB", flush=True)
+    artefatos_mod._cache.clear()
+    return resultados
+
+
+def metadados():
+    try:
+        commit = subprocess.run(["git", "-C", ROOT, "rev-parse", "--short", "HEAD"],
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def comparar(resultados, caminho_base, limite):
+    """Imprime p50 base × atual por caso; retorna o número de regressões."""
+    with open(caminho_base, encoding="utf-8") as f:
+        base = {(r["case"], r["n_observations"]): r for r in json.load(f)["results"]}
+
+    print(f"\n=== Comparação com {caminho_base} (limite {limite:.2f}x no p50) ===")
+    regressoes = 0
+    for r in resultados:
+        anterior = base.get((r["case"], r["n_observations"]))
+        if anterior is None:
+            continue
+        razao = r["p50_ms"] / max(anterior["p50_ms"], 1e-9)
+        marca = "REGRESSÃO" if razao > limite else ""
+        regressoes += razao > limite
+        print(f"  {r['size']:>5} {r['case']:<26} {anterior['p50_ms']:>10.3f} -> {r['p50_ms']:>10.3f} ms"
+              f"  ({razao:5.2f}x) {marca}")
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks dos caminhos quentes do app BirdedexGO.")
+    parser.add_argument("--tamanhos", nargs="+", default=list(TAMANHOS), choices=list(TAMANHOS),
+                        help="tamanhos do dataset sintético (nº de observações)")
+    parser.add_argument("--usuarios", type=int, help="nº de usuários (padrão: proporcional às observações)")
+    parser.add_argument("--especies", type=int, help="nº de espécies (padrão: proporcional às observações)")
+    parser.add_argument("--clusters", type=int, default=14)
+    parser.add_argument("--repeticoes", type=int, default=REPETICOES)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--dados", help="pasta para guardar os bundles sintéticos entre execuções (padrão: temporária)")
+    parser.add_argument("--saida", help="arquivo JSON de resultados (padrão: benchmarks/results/<data>.json)")
+    parser.add_argument("--comparar", metavar="BASE", help="JSON de uma execução anterior para comparar")
+    parser.add_argument("--limite", type=float, default=LIMITE_REGRESSAO)
+    args = parser.parse_args()
+
+    pasta_dados = args.dados or tempfile.mkdtemp(prefix="birdedex-bench-")
+    resultados = []
+    try:
+        for rotulo in args.tamanhos:
+            resultados.extend(rodar_tamanho(rotulo, TAMANHOS[rotulo], args, pasta_dados))
+    finally:
+        if not args.dados:
+            shutil.rmtree(pasta_dados, ignore_errors=True)
+
+    saida = args.saida or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(saida)), exist_ok=True)
+    with open(saida, "w", encoding="utf-8") as f:
+        json.dump({"meta": metadados(), "results": resultados}, f, ensure_ascii=False, indent=2)
+    print(f"\nResultados salvos em: {saida}")
+
+    if args.comparar and comparar(resultados, args.comparar, args.limite):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
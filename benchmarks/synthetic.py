@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+synthetic.py
+Dados sintéticos no formato do export do iNaturalist para os benchmarks.
+
+generate_dataset() gera as colunas que o prepare_data_app.py lê (COLUNAS_OBS)
+e a tabela user_login -> cluster, com as distribuições que pesam no app:
+
+- atividade dos usuários e popularidade das espécies em cauda longa (Zipf):
+  poucos usuários fazem a maior parte dos registros e poucas espécies
+  concentram a maior parte das observações;
+- cada usuário observa em torno de um hotspot "de casa" e, às vezes, em
+  qualquer ponto da região;
+- o cluster do usuário acompanha o hotspot, e uma fração fica como outlier (-1).
+
+build_bundle() passa esses dados pelas mesmas funções do prepare_data_app.py e
+grava um bundle de artefatos que o app carrega com carregar_artefatos().
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for pasta in ("app", "scripts", "Notebooks"):
+    caminho = os.path.join(ROOT, pasta)
+    if caminho not in sys.path:
+        sys.path.insert(0, caminho)
+
+REGIAO = {
+    "nome": "Região sintética",
+    "bbox": {"lat_min": -24.00, "lat_max": -23.30, "lon_min": -46.80, "lon_max": -46.30},
+    "centro": [-23.5505, -46.6333],
+    "hemisferio": "sul",
+}
+
+USER_ACTIVITY_EXPONENT = 0.9    # peso do usuário de posto r: 1 / r**expoente
+SPECIES_POPULARITY_EXPONENT = 1.1
+HOME_SPREAD_DEG = 0.03          # desvio das observações em torno do hotspot do usuário
+ROAMING_FRACTION = 0.2          # observações em qualquer ponto da região
+OUTLIER_FRACTION = 0.05         # usuários com cluster -1
+
+
+def default_sizes(n_obs):
+    """(usuários, espécies) proporcionais a n_obs, na escala do dataset de São Paulo."""
+    n_users = max(50, n_obs // 40)
+    n_species = int(min(900, max(60, n_obs // 100)))
+    return n_users, n_species
+
+
+def _zipf_weights(n, exponent):
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+def generate_dataset(n_obs, n_users=None, n_species=None, n_clusters=14, regiao=REGIAO, seed=42):
+    """Retorna (observações, clusters).
+
+    observações -> DataFrame com as colunas COLUNAS_OBS do prepare_data_app.py
+    clusters    -> DataFrame [user_login, cluster] de todos os usuários
+    """
+    default_users, default_species = default_sizes(n_obs)
+    n_users = n_users or default_users
+    n_species = n_species or default_species
+    rng = np.random.default_rng(seed)
+    bbox = regiao["bbox"]
+
+    # Hotspots espalhados pela região; o cluster do usuário segue o hotspot de casa
+    n_hotspots = max(n_clusters, n_users // 50)
+    hotspot_lat = rng.uniform(bbox["lat_min"], bbox["lat_max"], n_hotspots)
+    hotspot_lon = rng.uniform(bbox["lon_min"], bbox["lon_max"], n_hotspots)
+    home = rng.integers(0, n_hotspots, n_users)
+
+    user = rng.choice(n_users, size=n_obs, p=_zipf_weights(n_users, USER_ACTIVITY_EXPONENT))
+    species = rng.choice(n_species, size=n_obs, p=_zipf_weights(n_species, SPECIES_POPULARITY_EXPONENT))
+
+    latitude = hotspot_lat[home[user]] + rng.normal(0, HOME_SPREAD_DEG, n_obs)
+    longitude = hotspot_lon[home[user]] + rng.normal(0, HOME_SPREAD_DEG, n_obs)
+    roaming = rng.random(n_obs) < ROAMING_FRACTION
+    latitude[roaming] = rng.uniform(bbox["lat_min"], bbox["lat_max"], roaming.sum())
+    longitude[roaming] = rng.uniform(bbox["lon_min"], bbox["lon_max"], roaming.sum())
+
+    inicio = np.datetime64("2015-01-01")
+    dias = (np.datetime64("2025-12-31") - inicio).astype(int)
+    observed_on = inicio + rng.integers(0, dias, n_obs).astype("timedelta64[D]")
+
+    # Os textos repetidos apontam para os mesmos objetos str: 8 bytes por linha
+    logins = np.array([f"usuario{i}" for i in range(n_users)], dtype=object)
+    scientific = np.array([f"Avis synthetica{i:04d}" for i in range(n_species)], dtype=object)
+    common = np.array([f"Ave sintética {i}; Synthetic bird {i}" for i in range(n_species)], dtype=object)
+    images = np.array([f"https://static.inaturalist.org/photos/{i}/medium.jpg" for i in range(n_species)], dtype=object)
+
+    observacoes = pd.DataFrame({
+        "id": np.arange(1, n_obs + 1, dtype=np.int64),
+        "user_login": logins[user],
+        "observed_on": observed_on.astype("datetime64[ns]"),
+        "latitude": latitude,
+        "longitude": longitude,
+        "scientific_name": scientific[species],
+        "common_name": common[species],
+        "image_url": images[species],
+    })
+
+    cluster = (home % n_clusters).astype(np.int64)
+    cluster[rng.random(n_users) < OUTLIER_FRACTION] = -1
+    clusters = pd.DataFrame({"user_login": logins, "cluster": cluster})
+    return observacoes, clusters
+
+
+def build_bundle(observacoes, clusters, output_dir, chave="sintetico", regiao=REGIAO):
+    """Grava em output_dir o bundle de artefatos do app para os dados sintéticos."""
+    import prepare_data_app as prep
+
+    df_merged = prep.limpar_observacoes(observacoes, clusters, regiao)
+    vocabulario = prep.estender_vocabulario(None, df_merged)
+    df_merged["species_id"] = pd.Categorical(
+        df_merged["scientific_name"], categories=vocabulario["scientific_name"]
+    ).codes.astype(np.int32)
+    contagens_cluster, contagens_estacao = prep.agregar(df_merged)
+
+    df_obs_app = df_merged.drop(columns=["scientific_name", "common_name", "image_url"])
+    a = prep.derivar_artefatos(df_obs_app, vocabulario, contagens_cluster, contagens_estacao)
+    prep.escrever_bundle(output_dir, chave, regiao, a)
+    return output_dir
@@ -1,13 +1,19 @@
 #!/usr/bin/env python3
 # ============================================================
 # 01_filter_sao_paulo.py
-# Filtra observações do iNaturalist para apenas a cidade de São Paulo
+# Filtra observações do iNaturalist para as regiões do registro
+# (app/regioes.json), numa única passada sobre o export
 # ============================================================
 
 import os
+import shutil
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import matplotlib.pyplot as plt
 
+from regions import load_regions, build_region_index, assign_regions, dataset_path
+
 # ------------------------------------------------------------
 # Caminhos
 # ------------------------------------------------------------
@@ -21,63 +27,130 @@ os.makedirs(data_dir, exist_ok=True)
 os.makedirs(figs_dir, exist_ok=True)
 
 # ------------------------------------------------------------
-# Carregar dados
+# Leitura em blocos
+# Apenas as colunas usadas pelos scripts seguintes são lidas; cada bloco é
+# filtrado e gravado antes do próximo, então a memória não cresce com o
+# tamanho do export.
 # ------------------------------------------------------------
-print(" Carregando dados...")
-df = pd.read_csv(data_raw)
-print(f" Dados carregados: {df.shape[0]} observações, {df.shape[1]} colunas")
+CHUNK_SIZE = 500_000
+PLOT_SAMPLE_PER_CHUNK = 20_000
 
-# ------------------------------------------------------------
-# Filtrar apenas linhas com coordenadas válidas
-# ------------------------------------------------------------
-df = df.dropna(subset=["latitude", "longitude"])
-print(f"Após remover coordenadas nulas: {df.shape[0]} observações")
+# coluna -> (dtype na leitura, tipo no Parquet)
+COLUMNS = {
+    "id": ("Int64", pa.int64()),
+    "user_id": ("Int64", pa.int64()),
+    "user_login": (str, pa.string()),
+    "observed_on": (str, pa.string()),
+    "latitude": ("float64", pa.float64()),
+    "longitude": ("float64", pa.float64()),
+    "scientific_name": (str, pa.string()),
+    "common_name": (str, pa.string()),
+    "image_url": (str, pa.string()),
+    "iconic_taxon_name": (str, pa.string()),
+    "species_guess": (str, pa.string()),
+}
 
 # ------------------------------------------------------------
-# Filtro geográfico para a cidade de São Paulo
-# Aproximadamente entre:
-#   Latitude: -24.00 a -23.30
-#   Longitude: -46.80 a -46.30
+# Filtro geográfico: regiões do registro
+# Cada ponto é testado só contra as regiões cuja grade o cobre
+# (bbox e, se houver, polígono); regiões sobrepostas recebem o ponto.
 # ------------------------------------------------------------
-mask_sp = (
-    (df["latitude"] <= -23.30) & (df["latitude"] >= -24.00) &
-    (df["longitude"] <= -46.30) & (df["longitude"] >= -46.80)
+regions = load_regions()
+region_index = build_region_index(regions)
+print(f" Regiões: {', '.join(regions)}")
+
+header = pd.read_csv(data_raw, nrows=0).columns
+usecols = [c for c in COLUMNS if c in header]
+schema = pa.schema([(c, COLUMNS[c][1]) for c in usecols] + [("year", pa.int16())])
+
+# Um dataset Parquet por região (observations_<regiao>/year=AAAA/part-*.parquet);
+# year=0 = data inválida
+out_paths = {key: dataset_path(key, data_dir) for key in regions}
+for out_path in out_paths.values():
+    if os.path.exists(out_path):
+        shutil.rmtree(out_path)
+
+print(" Carregando dados em blocos...")
+n_total = n_coords = 0
+n_region = {key: 0 for key in regions}
+users = {key: set() for key in regions}
+species = {key: set() for key in regions}
+sample_all = []
+sample_region = {key: [] for key in regions}
+
+reader = pd.read_csv(
+    data_raw,
+    usecols=usecols,
+    dtype={c: COLUMNS[c][0] for c in usecols},
+    chunksize=CHUNK_SIZE,
 )
+for i, chunk in enumerate(reader):
+    n_total += len(chunk)
+
+    # Filtrar apenas linhas com coordenadas válidas
+    chunk = chunk.dropna(subset=["latitude", "longitude"])
+    n_coords += len(chunk)
+    sample_all.append(chunk[["longitude", "latitude"]].sample(min(len(chunk), PLOT_SAMPLE_PER_CHUNK), random_state=i))
+
+    if "iconic_taxon_name" in chunk.columns:
+        chunk = chunk[chunk["iconic_taxon_name"] == "Aves"]
+    if chunk.empty:
+        continue
 
-df_sp = df[mask_sp].copy()
-print(f" Observações dentro da cidade de São Paulo: {df_sp.shape[0]}")
+    chunk = chunk.assign(
+        year=pd.to_datetime(chunk["observed_on"], errors="coerce").dt.year.fillna(0).astype("int16")
+    )
+
+    for key, mask in assign_regions(region_index, chunk["latitude"], chunk["longitude"]).items():
+        chunk_region = chunk[mask]
+
+        n_region[key] += len(chunk_region)
+        if "user_id" in chunk_region.columns:
+            users[key].update(chunk_region["user_id"].unique())
+        if "scientific_name" in chunk_region.columns:
+            species[key].update(chunk_region["scientific_name"].dropna().unique())
+        sample_region[key].append(
+            chunk_region[["longitude", "latitude"]].sample(min(len(chunk_region), PLOT_SAMPLE_PER_CHUNK), random_state=i)
+        )
+
+        table = pa.Table.from_pandas(chunk_region, schema=schema, preserve_index=False)
+        pq.write_to_dataset(table, out_paths[key], partition_cols=["year"], basename_template=f"part-{i:05d}-{{i}}.parquet")
+
+print(f" Dados carregados: {n_total} observações, {len(usecols)} colunas lidas")
+print(f"Após remover coordenadas nulas: {n_coords} observações")
 
 # ------------------------------------------------------------
 # Estatísticas rápidas
 # ------------------------------------------------------------
-n_users = df_sp["user_id"].nunique() if "user_id" in df_sp.columns else "?"
-n_species = df_sp["scientific_name"].nunique() if "scientific_name" in df_sp.columns else "?"
-print(f" Usuários únicos: {n_users}")
-print(f" Espécies únicas: {n_species}")
+for key, region in regions.items():
+    n_users = len(users[key]) if "user_id" in usecols else "?"
+    n_species = len(species[key]) if "scientific_name" in usecols else "?"
+    print(f" {region['nome']}: {n_region[key]} observações de aves, {n_users} usuários, {n_species} espécies")
 
 # ------------------------------------------------------------
-# Plotar mapa de pontos
+# Plotar mapa de pontos (amostra de cada bloco)
 # ------------------------------------------------------------
+df = pd.concat(sample_all) if sample_all else pd.DataFrame(columns=["longitude", "latitude"])
+
 plt.figure(figsize=(6, 6))
 plt.scatter(df["longitude"], df["latitude"], s=1, alpha=0.1, color="gray", label="Todas as observações")
-plt.scatter(df_sp["longitude"], df_sp["latitude"], s=3, color="red", label="São Paulo (filtro aplicado)")
+for key, region in regions.items():
+    if sample_region[key]:
+        df_region = pd.concat(sample_region[key])
+        plt.scatter(df_region["longitude"], df_region["latitude"], s=3, label=f"{region['nome']} (filtro aplicado)")
 plt.xlabel("Longitude")
 plt.ylabel("Latitude")
 plt.legend(markerscale=3)
-plt.title("Distribuição das observações - São Paulo")
+plt.title("Distribuição das observações por região")
 plt.tight_layout()
 
-fig_path = os.path.join(figs_dir, "sao_paulo_filter_map.png")
+fig_path = os.path.join(figs_dir, "regions_filter_map.png")
 plt.savefig(fig_path, dpi=300)
 plt.close()
 print(f" Figura salva: {fig_path}")
 
-# ------------------------------------------------------------
-# Salvar dataset filtrado
-# ------------------------------------------------------------
-out_path = os.path.join(data_dir, "observations_sao_paulo.csv")
-df_sp.to_csv(out_path, index=False)
-print(f" Dados filtrados salvos: {out_path}")
+for key in regions:
+    if n_region[key]:
+        print(f" Dados filtrados salvos: {out_paths[key]}")
 
 print("\n Filtro concluído com sucesso!")
-
@@ -1,16 +1,15 @@
 import os
 import numpy as np
-import pandas as pd
 import matplotlib.pyplot as plt
-from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
-from sklearn.metrics import silhouette_score
-import umap.umap_ as umap
+
+from umap_kmeans_sweep import run_sweep, NEIGHBORS_LIST, K_RANGE
+from observations import read_observations
+from knn_cache import cached_scaled, cached_knn
+from user_features import build_user_features, to_matrix, save_user_features
 
 # ============================================================
 # CONFIGURAÇÕES GERAIS
 # ============================================================
-DATA_FILE = "data_filtered/observations_sao_paulo.csv"
 OUTPUT_DIR = "processed"
 FIG_DIR = "figs"
 os.makedirs(OUTPUT_DIR, exist_ok=True)
@@ -20,8 +19,8 @@ os.makedirs(FIG_DIR, exist_ok=True)
 # 1️ CARREGAR DADOS
 # ============================================================
 print(" Carregando dados...")
-df = pd.read_csv(DATA_FILE)
-df = df[df["iconic_taxon_name"] == "Aves"]
+# O dataset de 00_filter_SP.py já contém apenas aves
+df = read_observations(["id", "user_login", "scientific_name", "latitude", "longitude"])
 
 # Remover registros com dados essenciais ausentes
 df = df.dropna(subset=["user_login", "scientific_name", "latitude", "longitude"])
@@ -31,74 +30,38 @@ print(f" Usuários únicos: {df['user_login'].nunique():,}")
 print(f" Espécies únicas: {df['scientific_name'].nunique():,}")
 
 # ============================================================
-# 2️ GERAR MATRIZ USUÁRIO × ESPÉCIE
+# 2️ GERAR MATRIZ USUÁRIO × ESPÉCIE (ESPARSA)
 # ============================================================
-print("\n Criando matriz usuário × espécie...")
-user_species = (
-    df.groupby(["user_login", "scientific_name"])
-      .size()
-      .unstack(fill_value=0)
-)
+print("\n Criando matriz usuário × espécie (CSR)...")
+user_species, users, species, features_extra = build_user_features(df)
 
-print(f" Matriz criada: {user_species.shape[0]} usuários × {user_species.shape[1]} espécies")
+print(f" Matriz criada: {user_species.shape[0]} usuários × {user_species.shape[1]} espécies "
+      f"({user_species.nnz:,} entradas não nulas)")
 
 # ============================================================
 # 3️ FEATURES ADICIONAIS POR USUÁRIO
 # ============================================================
+# latitude/longitude médias e num_observations entram como colunas extras
 print("\n➕ Adicionando features adicionais...")
-features_extra = df.groupby("user_login").agg({
-    "latitude": "mean",
-    "longitude": "mean",
-    "id": "count"  # número de observações
-}).rename(columns={"id": "num_observations"})
-
-# Combinar com matriz principal
-user_features = user_species.join(features_extra, how="left").fillna(0)
+user_features = to_matrix(user_species, features_extra)
 print(f" Dimensões após junção: {user_features.shape}")
 
 # ============================================================
 # 4️ NORMALIZAÇÃO
 # ============================================================
 print("\n⚖️ Normalizando dados...")
-scaler = StandardScaler()
-X_scaled = scaler.fit_transform(user_features)
+X_scaled = cached_scaled(user_features)
 
 # ============================================================
 # 5️ TESTAR DIFERENTES N_NEIGHBORS
 # ============================================================
-neighbors_list = [5, 10, 15, 20, 30, 50, 100]
-silhouette_results = []
-
-for n_neighbors in neighbors_list:
-    print(f"\n UMAP + KMeans para n_neighbors = {n_neighbors}...")
-
-    reducer = umap.UMAP(
-        n_neighbors=n_neighbors,
-        n_components=2,
-        random_state=42,
-        min_dist=0.1,
-        metric="euclidean"
-    )
-
-    X_umap = reducer.fit_transform(X_scaled)
-
-    # Testar vários K via silhouette
-    best_score = -1
-    best_k = None
-    best_labels = None
-
-    for k in range(2, 15):
-        km = KMeans(n_clusters=k, random_state=42)
-        labels = km.fit_predict(X_umap)
-        score = silhouette_score(X_umap, labels)
-
-        if score > best_score:
-            best_score = score
-            best_k = k
-            best_labels = labels
+knn = cached_knn(X_scaled, max(NEIGHBORS_LIST))
+silhouette_df, embeddings, best_labels_by_n = run_sweep(X_scaled, NEIGHBORS_LIST, K_RANGE, knn=knn)
 
-    silhouette_results.append((n_neighbors, best_k, best_score))
-    print(f" Melhor K={best_k} com silhouette={best_score:.3f}")
+for n_neighbors, best_k, best_score in silhouette_df.itertuples(index=False):
+    print(f" n_neighbors={n_neighbors}: melhor K={best_k} com silhouette={best_score:.3f}")
+    X_umap = embeddings[n_neighbors]
+    best_labels = best_labels_by_n[n_neighbors]
 
     # Plot UMAP
     plt.figure(figsize=(8, 6))
@@ -115,9 +78,8 @@ for n_neighbors in neighbors_list:
 # ============================================================
 print("\n Salvando dados e métricas...")
 np.save(f"{OUTPUT_DIR}/user_umap_ready.npy", X_umap)
-user_features.to_csv(f"{OUTPUT_DIR}/user_features_normalized.csv")
+save_user_features(user_species, users, species, features_extra)
 
-silhouette_df = pd.DataFrame(silhouette_results, columns=["n_neighbors", "best_k", "silhouette_score"])
 silhouette_df.to_csv(f"{OUTPUT_DIR}/umap_kmeans_silhouette_summary.csv", index=False)
 
 # Gráfico de resumo
@@ -1,83 +1,108 @@
 import os
-import pandas as pd
 import numpy as np
-import umap.umap_ as umap
-import hdbscan
-from sklearn.preprocessing import StandardScaler
+import pandas as pd
 import matplotlib.pyplot as plt
 
+from observations import read_observations
+from outlier_labels import outlier_frame, LABELS_PATH
+from outlier_model import fit_outlier_model, predict_outliers, save_outlier_model, load_outlier_model, MODEL_PATH
+from user_features import build_feature_matrix, load_user_features, row_hashes, to_matrix
+
 # ============================================================
 # CONFIGURAÇÕES
 # ============================================================
-INPUT_FILE = "processed/user_features_normalized.csv"
 OUTPUT_DIR = "processed"
 FIG_DIR = "figs"
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 os.makedirs(FIG_DIR, exist_ok=True)
 
-print(" Carregando dados normalizados...")
-user_features = pd.read_csv(INPUT_FILE, index_col=0)
+# Com modelo e rótulos já salvos, só os usuários novos ou com features alteradas
+# (feature_hash diferente do gravado) são classificados (approximate_predict).
+# REFIT = True refaz UMAP + HDBSCAN sobre a base inteira.
+REFIT = False
 
-# Mantém apenas colunas numéricas
-X = user_features.select_dtypes(include=[np.number])
+if not REFIT and os.path.exists(MODEL_PATH) and os.path.exists(LABELS_PATH):
+    # ============================================================
+    # 1️ CLASSIFICAR USUÁRIOS NOVOS OU COM FEATURES ALTERADAS
+    # ============================================================
+    print(" Carregando modelo HDBSCAN salvo e rótulos existentes...")
+    model = load_outlier_model(MODEL_PATH)
+    existing = pd.read_parquet(LABELS_PATH)
 
-# ============================================================
-# 1️ NORMALIZAÇÃO E REDUÇÃO DE DIMENSIONALIDADE (UMAP)
-# ============================================================
-scaler = StandardScaler()
-X_scaled = scaler.fit_transform(X)
+    df = read_observations(["id", "user_login", "scientific_name", "latitude", "longitude"])
+    users, X = build_feature_matrix(df, model["species"], model["extra_cols"])
+    hashes = row_hashes(X)
 
-print(" Reduzindo dimensionalidade com UMAP...")
-reducer = umap.UMAP(n_neighbors=15, n_components=2, random_state=42, min_dist=0.1)
-X_umap = reducer.fit_transform(X_scaled)
+    known = pd.Index(existing["user_login"]).get_indexer(users)
+    stale = known == -1
+    print(f" Usuários novos: {stale.sum():,}")
+    if "feature_hash" in existing:
+        changed = existing["feature_hash"].to_numpy()[known[~stale]] != hashes[~stale]
+        print(f" Usuários com features alteradas: {changed.sum():,}")
+        stale[~stale] = changed
+    else:
+        # Rótulos de uma versão sem hash: grava o hash atual, sem reclassificar
+        print(" Rótulos sem feature_hash: mudanças anteriores a esta execução não são detectadas")
+        pos = users.get_indexer(existing["user_login"])
+        existing["feature_hash"] = np.where(pos >= 0, hashes[pos], np.uint64(0))
 
-# ============================================================
-# 2️ CLUSTERIZAÇÃO COM HDBSCAN
-# ============================================================
-print(" Aplicando HDBSCAN para detectar clusters e outliers...")
-clusterer = hdbscan.HDBSCAN(min_cluster_size=15, min_samples=10, metric='euclidean')
-labels = clusterer.fit_predict(X_umap)
+    predicted = predict_outliers(model, users[stale], X[stale])
+    kept = existing[~existing["user_login"].isin(predicted["user_login"])]
+    result = pd.concat([kept, predicted], ignore_index=True)
+    result.to_parquet(LABELS_PATH, index=False)
+    print(f" Rótulos atualizados em: {LABELS_PATH}")
+    labels = result["cluster"].to_numpy()
 
-user_features["cluster"] = labels
-user_features["is_outlier"] = (labels == -1)
+else:
+    print(" Carregando matriz usuário × espécie (esparsa)...")
+    user_species, users, species, features_extra = load_user_features()
+    X = to_matrix(user_species, features_extra)
 
-# ============================================================
-# 3️ SALVAR RESULTADOS
-# ============================================================
-output_path = os.path.join(OUTPUT_DIR, "user_clusters_hdbscan.csv")
-user_features.to_csv(output_path)
-print(f" Clusters e outliers salvos em: {output_path}")
+    # ============================================================
+    # 1️ NORMALIZAÇÃO, UMAP E HDBSCAN (BORŮVKA, NÚCLEOS EM PARALELO)
+    # ============================================================
+    print(" Reduzindo dimensionalidade com UMAP e aplicando HDBSCAN...")
+    model, X_umap, labels, outlier_scores = fit_outlier_model(X, species)
 
-# ============================================================
-# 4️ PLOTS
-# ============================================================
-plt.figure(figsize=(8, 6))
-plt.scatter(X_umap[:, 0], X_umap[:, 1], c=labels, cmap="Spectral", s=10)
-plt.title("Clusters HDBSCAN (UMAP 2D)", fontsize=12)
-plt.xlabel("UMAP-1")
-plt.ylabel("UMAP-2")
-plt.tight_layout()
-plt.savefig(f"{FIG_DIR}/hdbscan_umap_clusters.png", dpi=300)
-plt.close()
+    # ============================================================
+    # 2️ SALVAR MODELO E RÓTULOS
+    # ============================================================
+    # Só login + rótulos (+ hash da linha de features): as features continuam no bundle esparso de user_features.py
+    result = outlier_frame(users, labels, outlier_scores, row_hashes(X))
+    result.to_parquet(LABELS_PATH, index=False)
+    save_outlier_model(model, MODEL_PATH)
+    print(f" Clusters e outliers salvos em: {LABELS_PATH}")
+    print(f" Modelo salvo em: {MODEL_PATH}")
+
+    # ============================================================
+    # 3️ PLOTS
+    # ============================================================
+    plt.figure(figsize=(8, 6))
+    plt.scatter(X_umap[:, 0], X_umap[:, 1], c=labels, cmap="Spectral", s=10)
+    plt.title("Clusters HDBSCAN (UMAP 2D)", fontsize=12)
+    plt.xlabel("UMAP-1")
+    plt.ylabel("UMAP-2")
+    plt.tight_layout()
+    plt.savefig(f"{FIG_DIR}/hdbscan_umap_clusters.png", dpi=300)
+    plt.close()
 
-# Plot de outliers
-plt.figure(figsize=(8, 6))
-plt.scatter(X_umap[:, 0], X_umap[:, 1], c=user_features["is_outlier"], cmap="coolwarm", s=10)
-plt.title("Detecção de Outliers (HDBSCAN)", fontsize=12)
-plt.xlabel("UMAP-1")
-plt.ylabel("UMAP-2")
-plt.tight_layout()
-plt.savefig(f"{FIG_DIR}/hdbscan_outliers.png", dpi=300)
-plt.close()
+    # Plot de outliers
+    plt.figure(figsize=(8, 6))
+    plt.scatter(X_umap[:, 0], X_umap[:, 1], c=result["is_outlier"], cmap="coolwarm", s=10)
+    plt.title("Detecção de Outliers (HDBSCAN)", fontsize=12)
+    plt.xlabel("UMAP-1")
+    plt.ylabel("UMAP-2")
+    plt.tight_layout()
+    plt.savefig(f"{FIG_DIR}/hdbscan_outliers.png", dpi=300)
+    plt.close()
 
 # ============================================================
-# 5️ RESUMO DE RESULTADOS
+# 4️ RESUMO DE RESULTADOS
 # ============================================================
-n_outliers = user_features["is_outlier"].sum()
-n_total = len(user_features)
+n_outliers = result["is_outlier"].sum()
+n_total = len(result)
 perc = n_outliers / n_total * 100
 
 print(f"\n Total de usuários analisados: {n_total}")
 print(f" Outliers detectados: {n_outliers} ({perc:.2f}%)")
 print(f" Clusters formados (excluindo -1): {len(set(labels)) - (1 if -1 in labels else 0)}")
-
@@ -0,0 +1,72 @@
+import os
+import pandas as pd
+import matplotlib.pyplot as plt
+
+from cluster_model import fit_cluster_model, save_cluster_model, MODEL_PATH, FINAL_NEIGHBORS, FINAL_K
+from user_features import load_user_features, to_matrix
+from outlier_labels import read_outlier_labels
+
+# ============================================================
+# CONFIGURAÇÕES
+# ============================================================
+FINAL_FILE = "processed/user_clusters_kmeans_final.csv"
+
+# MiniBatchKMeans em blocos (bases com milhões de usuários) em vez do KMeans completo;
+# o embedding vai para cluster_model.EMBEDDING_PATH e o ajuste lê do disco
+MINIBATCH = False
+
+FIG_DIR = "figs/cleaned_analysis"
+os.makedirs(FIG_DIR, exist_ok=True)
+
+# ============================================================
+# 1️ CARREGAR DADOS E REMOVER OUTLIERS
+# ============================================================
+print(" Carregando dados e clusters...")
+user_species, users, species, features_extra = load_user_features()
+clusters = read_outlier_labels()
+
+hdbscan_labels = clusters.set_index("user_login")["cluster"].reindex(users)
+keep = (hdbscan_labels.notna() & (hdbscan_labels != -1)).to_numpy()
+print(f" Usuários após remoção de outliers: {keep.sum()}")
+
+X = to_matrix(user_species, features_extra)[keep]
+
+# ============================================================
+# 2️ AJUSTAR O MODELO FINAL (ESCALA -> UMAP -> KMEANS)
+# ============================================================
+# Rótulos anteriores, quando existem, fixam os centróides iniciais: o cluster i continua sendo o cluster i
+init_labels = None
+if os.path.exists(FINAL_FILE):
+    previous = pd.read_csv(FINAL_FILE, usecols=["user_login", "cluster"]).set_index("user_login")["cluster"]
+    init_labels = previous.reindex(users[keep]).fillna(-1).astype(int).to_numpy()
+    print(f" Centróides iniciais a partir de {FINAL_FILE} ({(init_labels >= 0).sum()} usuários rotulados)")
+
+print(f"\n Gerando cluster final com n_neighbors={FINAL_NEIGHBORS} e k={FINAL_K}"
+      f"{' (MiniBatchKMeans)' if MINIBATCH else ''}...")
+model, X_umap, labels = fit_cluster_model(X, species, minibatch=MINIBATCH, init_labels=init_labels)
+
+# ============================================================
+# 3️ SALVAR MODELO E RÓTULOS
+# ============================================================
+# O modelo salvo atribui cluster a usuários novos (cluster_model.assign_clusters)
+save_cluster_model(model)
+print(f" Modelo salvo em: {MODEL_PATH}")
+
+final_df = pd.DataFrame({
+    "user_login": users[keep],
+    "cluster": labels,
+    "umap_x": X_umap[:, 0],
+    "umap_y": X_umap[:, 1],
+})
+final_df.to_csv(FINAL_FILE, index=False)
+print(f" Cluster final salvo em: {FINAL_FILE}")
+
+# Plot final
+plt.figure(figsize=(8, 6))
+plt.scatter(final_df["umap_x"], final_df["umap_y"], c=final_df["cluster"], cmap="Spectral", s=12)
+plt.title(f"Cluster Final — UMAP ({FINAL_NEIGHBORS} vizinhos) + KMeans (k={FINAL_K})")
+plt.xlabel("UMAP-1")
+plt.ylabel("UMAP-2")
+plt.tight_layout()
+plt.savefig(f"{FIG_DIR}/umap_kmeans_final.png", dpi=300)
+plt.close()
@@ -0,0 +1,44 @@
+import pandas as pd
+
+from observations import read_observations
+from cluster_model import load_cluster_model, save_cluster_model, assign_clusters, MODEL_PATH
+from outlier_labels import read_outlier_labels
+
+# ============================================================
+# CONFIGURAÇÕES
+# ============================================================
+FINAL_FILE = "processed/user_clusters_kmeans_final.csv"
+
+# Atualiza os centróides com os usuários novos (MiniBatchKMeans.partial_fit); False só atribui
+UPDATE_CENTROIDS = True
+
+# ============================================================
+# 1️ CARREGAR MODELO, RÓTULOS E OBSERVAÇÕES
+# ============================================================
+print(" Carregando modelo final e rótulos existentes...")
+model = load_cluster_model(MODEL_PATH)
+final_df = pd.read_csv(FINAL_FILE)
+# Outliers do HDBSCAN ficam fora do arquivo final, mas não são usuários novos
+hdbscan_users = read_outlier_labels()["user_login"]
+
+df = read_observations(["id", "user_login", "scientific_name", "latitude", "longitude"])
+new_obs = df[~df["user_login"].isin(final_df["user_login"]) & ~df["user_login"].isin(hdbscan_users)]
+print(f" Usuários novos: {new_obs['user_login'].nunique():,}")
+
+# ============================================================
+# 2️ ATRIBUIR CLUSTER SEM REFAZER O UMAP
+# ============================================================
+assigned = assign_clusters(model, new_obs, update=UPDATE_CENTROIDS)
+print(" Distribuição dos usuários novos por cluster:")
+print(assigned["cluster"].value_counts().sort_index().to_string())
+
+# ============================================================
+# 3️ SALVAR
+# ============================================================
+# Usuários já rotulados mantêm o cluster; os novos entram no fim do arquivo
+pd.concat([final_df, assigned], ignore_index=True).to_csv(FINAL_FILE, index=False)
+print(f" Rótulos atualizados em: {FINAL_FILE}")
+
+if UPDATE_CENTROIDS and len(assigned):
+    save_cluster_model(model)
+    print(f" Centróides atualizados em: {MODEL_PATH}")
@@ -1,18 +1,15 @@
 import os
-import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
-from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
-from sklearn.metrics import silhouette_score
-import umap.umap_ as umap
+
+from umap_kmeans_sweep import run_sweep, NEIGHBORS_LIST, K_RANGE
+from knn_cache import cached_scaled, cached_knn
+from user_features import load_user_features, to_matrix
+from outlier_labels import read_outlier_labels
 
 # ============================================================
 # CONFIGURAÇÕES
 # ============================================================
-DATA_FILE = "processed/user_features_normalized.csv"
-HDBSCAN_FILE = "processed/user_clusters_hdbscan.csv"
-
 OUTPUT_DIR = "processed"
 FIG_DIR = "figs/cleaned_analysis"
 os.makedirs(FIG_DIR, exist_ok=True)
@@ -21,65 +18,39 @@ os.makedirs(FIG_DIR, exist_ok=True)
 # 1️ CARREGAR DADOS
 # ============================================================
 print(" Carregando dados e clusters...")
-df = pd.read_csv(DATA_FILE)
-clusters = pd.read_csv(HDBSCAN_FILE)
+user_species, users, species, features_extra = load_user_features()
+clusters = read_outlier_labels()
 
 if "user_login" not in clusters.columns:
     raise ValueError("❌ Arquivo HDBSCAN precisa conter a coluna 'user_login'.")
 
-# Combinar dados com clusters
-merged = df.merge(clusters, on="user_login", how="inner")
-print(f" Dados combinados: {merged.shape[0]} linhas")
+# Alinhar rótulos às linhas da matriz esparsa
+hdbscan_labels = clusters.set_index("user_login")["cluster"].reindex(users)
+print(f" Dados combinados: {hdbscan_labels.notna().sum()} linhas")
 
 # ============================================================
 # 2️ REMOVER OUTLIERS
 # ============================================================
-cleaned = merged[merged["cluster"] != -1].copy()
-print(f" Usuários após remoção de outliers: {cleaned.shape[0]}")
+keep = (hdbscan_labels.notna() & (hdbscan_labels != -1)).to_numpy()
+print(f" Usuários após remoção de outliers: {keep.sum()}")
 
 # ============================================================
 # 3️ NORMALIZAR FEATURES NUMÉRICAS
 # ============================================================
 print("⚖️ Reaplicando normalização nas features...")
-exclude_cols = ["user_login", "cluster"]
-X = cleaned.drop(columns=exclude_cols)
-scaler = StandardScaler()
-X_scaled = scaler.fit_transform(X)
+X = to_matrix(user_species, features_extra)[keep]
+X_scaled = cached_scaled(X)
 
 # ============================================================
 # 4️ TESTAR DIFERENTES N_NEIGHBORS + K
 # ============================================================
-neighbors_list = [5, 10, 15, 20, 30, 50, 100]
-silhouette_results = []
-
-for n_neighbors in neighbors_list:
-    print(f"\n Testando n_neighbors={n_neighbors}...")
-
-    reducer = umap.UMAP(
-        n_neighbors=n_neighbors,
-        n_components=2,
-        random_state=42,
-        min_dist=0.1,
-        metric="euclidean"
-    )
-    X_umap = reducer.fit_transform(X_scaled)
-
-    # Testar vários K
-    best_score = -1
-    best_k = None
-    best_labels = None
-
-    for k in range(2, 15):
-        km = KMeans(n_clusters=k, random_state=42)
-        labels = km.fit_predict(X_umap)
-        score = silhouette_score(X_umap, labels)
-        if score > best_score:
-            best_score = score
-            best_k = k
-            best_labels = labels
+knn = cached_knn(X_scaled, max(NEIGHBORS_LIST))
+silhouette_df, embeddings, best_labels_by_n = run_sweep(X_scaled, NEIGHBORS_LIST, K_RANGE, knn=knn)
 
-    silhouette_results.append((n_neighbors, best_k, best_score))
-    print(f" Melhor K={best_k} | Silhouette={best_score:.3f}")
+for n_neighbors, best_k, best_score in silhouette_df.itertuples(index=False):
+    print(f" n_neighbors={n_neighbors}: melhor K={best_k} com silhouette={best_score:.3f}")
+    X_umap = embeddings[n_neighbors]
+    best_labels = best_labels_by_n[n_neighbors]
 
     # Plot dos clusters
     plt.figure(figsize=(8, 6))
@@ -94,7 +65,6 @@ for n_neighbors in neighbors_list:
 # ============================================================
 # 5️⃣ SALVAR RESULTADOS
 # ============================================================
-silhouette_df = pd.DataFrame(silhouette_results, columns=["n_neighbors", "best_k", "silhouette_score"])
 silhouette_df.to_csv(f"{OUTPUT_DIR}/umap_kmeans_silhouette_cleaned.csv", index=False)
 
 # Gráfico comparativo
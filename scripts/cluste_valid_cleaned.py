@@ -7,6 +7,8 @@ Integra estatísticas ecológicas e espécies dominantes por cluster.
 
 import pandas as pd
 
+from cluster_stats import top_k_per_group
+
 print(" Carregando arquivos de entrada...")
 
 eco_path = "processed/cluster_ecology_summary.csv"
@@ -23,10 +25,8 @@ print(f" Top espécies: {species['cluster'].nunique()} clusters")
 # === 2️ Gerar top espécies agregadas (top N)
 top_n = 10
 top_species_summary = (
-    species.groupby("cluster")
-    .apply(lambda g: ", ".join(
-        g.sort_values("count", ascending=False).head(top_n)["common_name"]
-    ))
+    top_k_per_group(species, "cluster", "count", top_n, prop_col=None)
+    .groupby("cluster")["common_name"].agg(", ".join)
     .reset_index(name="top_species")
 )
 
@@ -3,11 +3,13 @@
 # ============================================================
 
 import pandas as pd
-import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 import os
 
+from observations import read_observations
+from cluster_stats import cluster_stats, top_k_per_group
+
 # ========================
 # 1️ Carregar os arquivos
 # ========================
@@ -15,12 +17,11 @@ import os
 print("🔹 Carregando dados...")
 
 # Diretórios
-data_obs = "data_filtered/observations_sao_paulo.csv"
-data_users = "processed/user_features_normalized.csv"
+data_users = "processed/user_clusters_kmeans_final.csv"
 data_clusters = "processed/cluster_summary.csv"
 
 # Carregar observações
-obs = pd.read_csv(data_obs)
+obs = read_observations(["id", "user_login", "scientific_name", "latitude", "longitude"])
 users = pd.read_csv(data_users)
 clusters = pd.read_csv(data_clusters)
 
@@ -36,7 +37,7 @@ for df in [obs, users, clusters]:
 
 # Verificar colunas essenciais
 if "user_login" not in obs.columns:
-    raise ValueError("❌ Coluna 'user_login' ausente em observations_sao_paulo.csv")
+    raise ValueError("❌ Coluna 'user_login' ausente no dataset de observações")
 
 if "cluster" not in users.columns and "cluster" not in clusters.columns:
     raise ValueError("❌ Nenhuma tabela contém coluna 'cluster'.")
@@ -47,33 +48,17 @@ if "cluster" in users.columns:
 else:
     raise ValueError("⚠️ Não encontrei 'cluster' associado aos usuários.")
 
-# Merge observações + cluster
-merged = obs.merge(cluster_df, on="user_login", how="inner")
-
-print(f" Dados combinados: {len(merged)} observações com cluster atribuído")
-
 # ==================================================
 # 3️ Estatísticas por cluster
 # ==================================================
 
 print("\n Calculando estatísticas ecológicas por cluster...")
 
-# Número de observações e espécies por cluster
-cluster_stats = (
-    merged.groupby("cluster")
-    .agg(
-        n_observations=("id", "count"),
-        n_species=("scientific_name", "nunique"),
-        n_users=("user_login", "nunique"),
-        lat_mean=("latitude", "mean"),
-        lon_mean=("longitude", "mean"),
-        lat_std=("latitude", "std"),
-        lon_std=("longitude", "std"),
-    )
-    .reset_index()
-)
+# Observações, espécies, usuários, lat/lon e contagens por espécie numa única passada (sem merge)
+cluster_summary, species_cluster = cluster_stats(obs, cluster_df)
 
-print(cluster_stats)
+print(f" Dados combinados: {cluster_summary['n_observations'].sum()} observações com cluster atribuído")
+print(cluster_summary)
 
 # ==================================================
 # 4️ Espécies dominantes por cluster
@@ -81,21 +66,8 @@ print(cluster_stats)
 
 print("\n🦜 Identificando espécies dominantes...")
 
-species_cluster = (
-    merged.groupby(["cluster", "scientific_name"])
-    .size()
-    .reset_index(name="count")
-)
-
-# Calcular proporção dentro do cluster
-species_cluster["prop_cluster"] = species_cluster.groupby("cluster")["count"].apply(
-    lambda x: x / x.sum()
-)
-
-# Top 10 espécies por cluster
-top_species = species_cluster.groupby("cluster").apply(
-    lambda x: x.sort_values("prop_cluster", ascending=False).head(10)
-).reset_index(drop=True)
+# Top 10 espécies por cluster (species_cluster já traz count e prop_cluster)
+top_species = top_k_per_group(species_cluster, "cluster", "count", 10, prop_col="prop_cluster")
 
 os.makedirs("processed", exist_ok=True)
 top_species.to_csv("processed/cluster_species_summary.csv", index=False)
@@ -135,6 +107,7 @@ print(" Heatmap salvo em figs/cluster_analysis/species_cluster_heatmap.png")
 print("\n🗺️ Gerando mapa de dispersão...")
 
 plt.figure(figsize=(8, 8))
+merged = obs.assign(cluster=obs["user_login"].map(cluster_df.set_index("user_login")["cluster"])).dropna(subset=["cluster"])
 sns.scatterplot(
     data=merged,
     x="longitude",
@@ -1,13 +1,17 @@
 import pandas as pd
 from pathlib import Path
 
+from observations import read_observations
+from outlier_labels import read_outlier_labels
+from cluster_stats import cluster_stats, top_k_per_group
+
 print(" Carregando dados...")
 
 # ======================
 # 1️ Carregar datasets
 # ======================
-obs = pd.read_csv("data_filtered/observations_sao_paulo.csv")
-users = pd.read_csv("processed/user_clusters_hdbscan.csv")
+obs = read_observations(["id", "user_login", "scientific_name", "latitude", "longitude"])
+users = read_outlier_labels()
 
 print(f" Observações: {len(obs)} registros")
 print(f" Usuários: {len(users)} registros")
@@ -26,51 +30,43 @@ users = users[users["cluster"] != -1]
 print(f"🧹 Clusters válidos: {users['cluster'].nunique()}")
 
 # ======================
-# 4️ Garantir chave de merge
+# 4️ Garantir chave de usuário
 # ======================
 if "user_login" not in users.columns:
     alt_user_col = [c for c in users.columns if "user" in c.lower()][0]
     users = users.rename(columns={alt_user_col: "user_login"})
 
-# Evita sobrescrever colunas do dataset de observações
-user_cols = [c for c in users.columns if c not in ["user_login"]]
-users_renamed = users.rename(columns={c: f"user_{c}" for c in user_cols})
-
 # ======================
-# 5️ Merge seguro
+# 5️ Converter coordenadas
 # ======================
-merged = obs.merge(users_renamed, on="user_login", how="inner")
-print(f" Merge concluído: {len(merged)} observações associadas a clusters")
-
-# Verificação de colunas após o merge
-print("🔍 Colunas após merge:", [c for c in merged.columns if "lat" in c or "lon" in c][:6])
+obs[lat_col] = pd.to_numeric(obs[lat_col], errors="coerce")
+obs[lon_col] = pd.to_numeric(obs[lon_col], errors="coerce")
 
 # ======================
-# 6️ Converter coordenadas
-# ======================
-merged[lat_col] = pd.to_numeric(merged[lat_col], errors="coerce")
-merged[lon_col] = pd.to_numeric(merged[lon_col], errors="coerce")
-
-# ======================
-# 7️ Estatísticas por cluster
+# 6️ Estatísticas por cluster (uma passada, sem merge)
 # ======================
 print("📊 Calculando estatísticas por cluster...")
 
-def top_species(series, n=10):
-    return ", ".join(series.value_counts().head(n).index)
+summary, species_counts = cluster_stats(obs, users[["user_login", "cluster"]], lat_col=lat_col, lon_col=lon_col)
+print(f" {summary['n_observations'].sum()} observações associadas a clusters")
 
-cluster_summary = (
-    merged.groupby("user_cluster")
-    .agg(
-        n_users=("user_login", "nunique"),
-        n_obs=("id", "count"),
-        top_species=("scientific_name", lambda x: top_species(x)),
-        mean_lat=(lat_col, "mean"),
-        mean_lon=(lon_col, "mean"),
-    )
-    .reset_index()
+# ======================
+# 7️ Top 10 espécies de cada cluster
+# ======================
+top_species = (
+    top_k_per_group(species_counts, "cluster", "count", 10, prop_col=None)
+    .groupby("cluster")["scientific_name"].agg(", ".join)
 )
 
+cluster_summary = pd.DataFrame({
+    "user_cluster": summary["cluster"],
+    "n_users": summary["n_users"],
+    "n_obs": summary["n_observations"],
+    "top_species": top_species.reindex(summary["cluster"]).to_numpy(),
+    "mean_lat": summary["lat_mean"],
+    "mean_lon": summary["lon_mean"],
+})
+
 # ======================
 # 8️ Salvar
 # ======================
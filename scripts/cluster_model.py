@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+cluster_model.py
+Modelo final de clusterização de usuários (StandardScaler -> UMAP -> KMeans)
+salvo em disco, e atribuição de cluster a usuários que não estavam no ajuste.
+
+O UMAP ajustado guarda o índice de vizinhos dos usuários de treino, então
+`transform` projeta usuários novos no mesmo embedding sem refazer o ajuste; o
+cluster é o centróide KMeans mais próximo. Serve tanto para um lote (todos os
+usuários novos de um dataset) quanto para um único usuário.
+
+Para bases muito grandes o KMeans pode rodar em mini-lotes (MiniBatchKMeans):
+o embedding é percorrido em blocos de MINIBATCH_SIZE linhas, inclusive a partir
+de um .npy aberto com mmap_mode="r", e usuários novos atualizam os centróides
+com partial_fit. Os centróides iniciais vêm de rótulos já existentes, para que
+o cluster i continue sendo o cluster i de user_clusters_kmeans_final.csv.
+"""
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.cluster import KMeans, MiniBatchKMeans
+import umap.umap_ as umap
+
+from model_io import load_model
+from user_features import EXTRA_COLS, build_feature_matrix, fit_scaler
+
+MODEL_PATH = "processed/cluster_model.joblib"
+# Embedding do ajuste final, gravado para o MiniBatchKMeans ler do disco (mmap_mode="r")
+EMBEDDING_PATH = "processed/user_umap_final.npy"
+
+# Configuração escolhida na análise (projeto_disciplina_.ipynb): UMAP(20) + KMeans(14)
+FINAL_NEIGHBORS = 20
+FINAL_K = 14
+RANDOM_STATE = 42
+MINIBATCH_SIZE = 4096
+
+
+def centroids_from_labels(X_umap, labels, k):
+    """Média do embedding por rótulo (0..k-1): centróides iniciais que preservam a numeração dos clusters."""
+    labels = np.asarray(labels)
+    X_umap = np.asarray(X_umap, dtype=np.float64)
+    counts = np.bincount(labels, minlength=k)
+    sums = np.stack([np.bincount(labels, weights=X_umap[:, j], minlength=k) for j in range(X_umap.shape[1])], axis=1)
+    return sums / np.maximum(counts, 1)[:, None]
+
+
+def _blocks(n, batch_size, min_size):
+    """Fatias de batch_size linhas; um último bloco com menos de min_size linhas é juntado ao anterior."""
+    starts = list(range(0, n, batch_size))
+    if len(starts) > 1 and n - starts[-1] < min_size:
+        starts.pop()
+    return [slice(start, end) for start, end in zip(starts, starts[1:] + [n])]
+
+
+def fit_kmeans(X_umap, k, minibatch=False, init=None, batch_size=MINIBATCH_SIZE, random_state=RANDOM_STATE):
+    """KMeans do embedding. Com minibatch=True, MiniBatchKMeans com partial_fit bloco a bloco.
+
+    X_umap pode ser um memmap: só um bloco de batch_size linhas é materializado por vez.
+    `init` (k × 2) fixa os centróides iniciais; sem ele o k-means++ usa random_state.
+    """
+    if not minibatch:
+        if init is None:
+            return KMeans(n_clusters=k, random_state=random_state).fit(X_umap)
+        return KMeans(n_clusters=k, init=init, n_init=1, random_state=random_state).fit(X_umap)
+
+    kmeans = MiniBatchKMeans(
+        n_clusters=k,
+        init="k-means++" if init is None else init,
+        n_init=1,
+        batch_size=batch_size,
+        random_state=random_state,
+    )
+    # partial_fit exige ao menos k linhas por bloco
+    for block in _blocks(len(X_umap), batch_size, k):
+        kmeans.partial_fit(np.asarray(X_umap[block], dtype=np.float64))
+    return kmeans
+
+
+def predict_chunked(kmeans, X_umap, batch_size=MINIBATCH_SIZE):
+    """kmeans.predict em blocos, para embeddings lidos do disco (memmap)."""
+    dtype = kmeans.cluster_centers_.dtype
+    return np.concatenate([
+        kmeans.predict(np.asarray(X_umap[start:start + batch_size], dtype=dtype))
+        for start in range(0, len(X_umap), batch_size)
+    ] or [np.empty(0, dtype=np.int32)])
+
+
+def fit_cluster_model(X, species, n_neighbors=FINAL_NEIGHBORS, k=FINAL_K, minibatch=False, init_labels=None,
+                      random_state=RANDOM_STATE, embedding_path=EMBEDDING_PATH):
+    """Ajusta escala, UMAP 2D e KMeans sobre X (usuários × espécies + EXTRA_COLS).
+
+    Retorna (model, X_umap, labels); `species` é a ordem das colunas de espécies de X.
+    `init_labels` (rótulos anteriores dos mesmos usuários, -1 = sem rótulo) fixa os
+    centróides iniciais, mantendo a numeração dos clusters entre ajustes.
+    Com minibatch=True o embedding é gravado em `embedding_path` e o KMeans é
+    ajustado a partir do arquivo (memmap); X_umap retornado é esse memmap.
+    """
+    scaler = fit_scaler(X)
+    reducer = umap.UMAP(
+        n_neighbors=n_neighbors,
+        n_components=2,
+        min_dist=0.1,
+        metric="euclidean",
+        random_state=random_state,
+    )
+    X_umap = reducer.fit_transform(scaler.transform(X))
+    if minibatch and embedding_path is not None:
+        np.save(embedding_path, X_umap)
+        X_umap = np.load(embedding_path, mmap_mode="r")
+    init = None
+    if init_labels is not None:
+        init_labels = np.asarray(init_labels)
+        rotulados = (init_labels >= 0) & (init_labels < k)
+        # Só vale se todos os k clusters anteriores têm usuários; senão, k-means++ com random_state
+        if np.unique(init_labels[rotulados]).size == k:
+            init = centroids_from_labels(X_umap[rotulados], init_labels[rotulados], k)
+    kmeans = fit_kmeans(X_umap, k, minibatch=minibatch, init=init, random_state=random_state)
+    labels = predict_chunked(kmeans, X_umap)
+
+    model = {
+        "scaler": scaler,
+        "umap": reducer,
+        "kmeans": kmeans,
+        "species": pd.Index(species, name="scientific_name"),
+        "extra_cols": list(EXTRA_COLS),
+    }
+    return model, X_umap, labels
+
+
+def save_cluster_model(model, path=MODEL_PATH):
+    joblib.dump(model, path)
+
+
+def load_cluster_model(path=MODEL_PATH):
+    return load_model(path)
+
+
+def update_centroids(model, X_umap, batch_size=MINIBATCH_SIZE):
+    """Atualiza os centróides do modelo com o embedding de usuários novos (partial_fit).
+
+    Um KMeans completo é trocado, na primeira atualização, por um MiniBatchKMeans
+    que parte dos mesmos centróides; a numeração dos clusters não muda. Lotes com
+    menos usuários que clusters (exigência do partial_fit) não alteram os centróides.
+    """
+    kmeans = model["kmeans"]
+    k = len(kmeans.cluster_centers_)
+    if len(X_umap) < k:
+        return model
+    if not isinstance(kmeans, MiniBatchKMeans):
+        kmeans = MiniBatchKMeans(n_clusters=k, init=kmeans.cluster_centers_.astype(np.float64), n_init=1,
+                                 batch_size=batch_size, random_state=RANDOM_STATE)
+        model["kmeans"] = kmeans
+    for block in _blocks(len(X_umap), batch_size, k):
+        kmeans.partial_fit(np.asarray(X_umap[block], dtype=np.float64))
+    return model
+
+
+def assign_clusters(model, df, update=False):
+    """Atribui o cluster mais próximo a cada usuário das observações em df.
+
+    df precisa das colunas id, user_login, scientific_name, latitude e longitude.
+    Com update=True os centróides do modelo também absorvem esses usuários
+    (update_centroids) antes da atribuição; salvar o modelo fica a cargo de quem chama.
+    Retorna DataFrame [user_login, cluster, umap_x, umap_y].
+    """
+    users, X = build_feature_matrix(df, model["species"], model["extra_cols"])
+    if len(users) == 0:
+        return pd.DataFrame({"user_login": pd.Series(dtype=str), "cluster": pd.Series(dtype=int),
+                             "umap_x": pd.Series(dtype=float), "umap_y": pd.Series(dtype=float)})
+
+    X_umap = model["umap"].transform(model["scaler"].transform(X))
+    if update:
+        update_centroids(model, X_umap)
+    labels = predict_chunked(model["kmeans"], X_umap)
+    return pd.DataFrame({
+        "user_login": users,
+        "cluster": labels,
+        "umap_x": X_umap[:, 0],
+        "umap_y": X_umap[:, 1],
+    })
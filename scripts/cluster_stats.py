@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+cluster_stats.py
+Estatísticas por cluster calculadas numa única passada sobre as observações.
+
+Os rótulos (user_login -> cluster) são ligados às observações pelos códigos
+inteiros de pd.factorize, sem materializar o merge; cada estatística é um
+np.bincount sobre esses códigos:
+
+- por cluster: n_observations, n_species, n_users, lat/lon mean e std;
+- por (cluster, espécie): count e prop_cluster.
+
+group_counts() é o mesmo motor para duas chaves quaisquer (equivale a
+df.groupby([a, b]).size()).
+
+Top-k por grupo sem groupby.apply: top_k_per_row() sobre a matriz densa
+cluster × espécie (np.argpartition) e top_k_per_group() sobre a tabela longa
+(uma ordenação + posição dentro do grupo).
+"""
+
+import numpy as np
+import pandas as pd
+
+# Acima deste número de células (n_a × n_b) a contagem de pares usa np.unique em vez da matriz densa
+DENSE_LIMIT = 50_000_000
+
+
+def _factorize(values):
+    """Códigos 0..n-1 em ordem crescente dos valores (-1 para nulos) e os valores distintos."""
+    codes, uniques = pd.factorize(values, sort=True)
+    return codes.astype(np.int64), uniques
+
+
+def pair_counts(a, b, n_a, n_b):
+    """Conta os pares (a, b) de códigos inteiros; retorna (a, b, count) dos pares presentes, ordenados.
+
+    Códigos negativos (nulos) são ignorados.
+    """
+    a = np.asarray(a, dtype=np.int64)
+    b = np.asarray(b, dtype=np.int64)
+    valid = (a >= 0) & (b >= 0)
+    flat = a[valid] * n_b + b[valid]
+    if n_a * n_b <= DENSE_LIMIT:
+        counts = np.bincount(flat, minlength=n_a * n_b)
+        flat = np.flatnonzero(counts)
+        counts = counts[flat]
+    else:
+        flat, counts = np.unique(flat, return_counts=True)
+    return flat // n_b, flat % n_b, counts
+
+
+def group_counts(df, keys, name="count"):
+    """df.groupby(keys).size().reset_index(name=name) para duas chaves, via bincount."""
+    key_a, key_b = keys
+    codes_a, uniques_a = _factorize(df[key_a])
+    codes_b, uniques_b = _factorize(df[key_b])
+    ia, ib, counts = pair_counts(codes_a, codes_b, len(uniques_a), len(uniques_b))
+    return pd.DataFrame({
+        key_a: uniques_a.take(ia),
+        key_b: uniques_b.take(ib),
+        name: counts,
+    })
+
+
+def _mean_std(codes, values, k):
+    """Média e desvio padrão amostral (ddof=1) por código, ignorando NaN."""
+    values = np.asarray(values, dtype=np.float64)
+    ok = ~np.isnan(values)
+    codes, values = codes[ok], values[ok]
+    n = np.bincount(codes, minlength=k)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.bincount(codes, weights=values, minlength=k) / n
+        sq = np.bincount(codes, weights=(values - mean[codes]) ** 2, minlength=k)
+        std = np.sqrt(sq / (n - 1))
+    std[n < 2] = np.nan
+    return mean, std
+
+
+def cluster_stats(obs, labels, species_col="scientific_name",
+                  lat_col="latitude", lon_col="longitude", user_col="user_login"):
+    """Resumo por cluster e contagens por (cluster, espécie) das observações de usuários rotulados.
+
+    obs    -> observações com user_col, species_col, lat_col e lon_col (lat_col/lon_col=None: sem coordenadas)
+    labels -> DataFrame [user_col, cluster] (um cluster por usuário)
+
+    Equivale ao inner merge obs × labels seguido dos groupbys por cluster.
+    Retorna (summary, species_counts):
+
+    summary        -> [cluster, n_observations, n_species, n_users, lat_mean, lon_mean, lat_std, lon_std]
+    species_counts -> [cluster, species_col, count, prop_cluster], por cluster e count decrescente
+    """
+    user_codes, users = _factorize(obs[user_col])
+    user_cluster = (
+        labels.drop_duplicates(user_col)
+        .set_index(user_col)["cluster"]
+        .reindex(users)
+    )
+    cluster_of_user, clusters = _factorize(user_cluster)
+    clusters = clusters.astype(labels["cluster"].dtype)
+    k = len(clusters)
+
+    # Código do cluster de cada observação; -1 = usuário sem rótulo (fica fora, como no inner merge)
+    codes = np.where(user_codes >= 0, cluster_of_user[user_codes], -1)
+    keep = codes >= 0
+    codes = codes[keep]
+
+    coords = []
+    for col in (lat_col, lon_col):
+        values = obs[col].to_numpy()[keep] if col is not None else np.full(len(codes), np.nan)
+        coords.extend(_mean_std(codes, values, k))
+    lat_mean, lat_std, lon_mean, lon_std = coords
+
+    species_codes, species = _factorize(obs[species_col].to_numpy()[keep])
+    ic, isp, counts = pair_counts(codes, species_codes, k, len(species))
+    totals = np.bincount(ic, weights=counts, minlength=k)
+
+    summary = pd.DataFrame({
+        "cluster": clusters,
+        "n_observations": np.bincount(codes, minlength=k),
+        "n_species": np.bincount(ic, minlength=k),
+        "n_users": np.bincount(cluster_of_user[cluster_of_user >= 0], minlength=k),
+        "lat_mean": lat_mean,
+        "lon_mean": lon_mean,
+        "lat_std": lat_std,
+        "lon_std": lon_std,
+    })
+
+    # Maior contagem primeiro; empates em ordem alfabética da espécie
+    order = np.lexsort((isp, -counts, ic))
+    species_counts = pd.DataFrame({
+        "cluster": clusters.take(ic[order]),
+        species_col: species.take(isp[order]),
+        "count": counts[order],
+        "prop_cluster": counts[order] / totals[ic[order]],
+    })
+    return summary, species_counts
+
+
+def top_k_per_row(matrix, k):
+    """Os k maiores valores de cada linha de uma matriz densa (grupos × itens), via np.argpartition.
+
+    Empates seguem o menor índice de coluna, como np.argsort(-linha, kind="stable")[:k].
+    Retorna (linhas, colunas, valores, proporções), por linha e valor decrescente;
+    a proporção é o valor sobre a soma da linha inteira.
+    """
+    matrix = np.asarray(matrix)
+    n_rows, n_cols = matrix.shape
+    k = min(k, n_cols)
+    if k == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, matrix[empty, empty], np.empty(0)
+
+    # k-ésimo maior valor de cada linha; entre os iguais a ele entram só os de menor índice
+    kth = -np.partition(-matrix, k - 1, axis=1)[:, k - 1]
+    above = matrix > kth[:, None]
+    tied = matrix == kth[:, None]
+    needed = k - above.sum(axis=1)
+    selected = above | (tied & (np.cumsum(tied, axis=1) <= needed[:, None]))
+
+    rows, cols = np.nonzero(selected)
+    values = matrix[rows, cols]
+    order = np.lexsort((cols, -values, rows))
+    rows, cols, values = rows[order], cols[order], values[order]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        props = values / matrix.sum(axis=1)[rows]
+    return rows, cols, values, props
+
+
+def top_k_per_group(df, group_col, count_col, k, prop_col="prop"):
+    """As k linhas de maior count_col em cada grupo de uma tabela longa (ex.: cluster, espécie, count).
+
+    Uma ordenação estável por (grupo, count decrescente) e a posição de cada linha
+    dentro do grupo; empates mantêm a ordem original. prop_col recebe count_col
+    sobre o total do grupo inteiro (antes do corte).
+    """
+    groups, _ = _factorize(df[group_col])
+    counts = df[count_col].to_numpy()
+    order = np.lexsort((-counts, groups))
+    sorted_groups = groups[order]
+
+    starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+    sizes = np.diff(np.r_[starts, len(order)])
+    rank = np.arange(len(order)) - np.repeat(starts, sizes)
+    order = order[rank < k]
+
+    top = df.iloc[order].reset_index(drop=True)
+    if prop_col is not None:
+        totals = np.bincount(groups[groups >= 0], weights=counts[groups >= 0])
+        top[prop_col] = counts[order] / totals[groups[order]]
+    return top
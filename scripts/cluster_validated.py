@@ -1,26 +1,29 @@
 import os
-import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
-from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
-import umap.umap_ as umap
+
+from observations import read_observations
+from knn_cache import cached_scaled, cached_umap
+from cluster_model import fit_kmeans, predict_chunked
+from user_features import build_user_features, to_matrix, cluster_mean_counts
+from cluster_stats import top_k_per_row
 
 # ============================================================
 # CONFIGURAÇÕES
 # ============================================================
-DATA_FILE = "data_filtered/observations_sao_paulo.csv"
 PROCESSED_DIR = "processed"
 FIG_DIR = "figs/cluster_analysis"
 os.makedirs(PROCESSED_DIR, exist_ok=True)
 os.makedirs(FIG_DIR, exist_ok=True)
 
+MINIBATCH = False  # MiniBatchKMeans em blocos para bases muito grandes
+
 # ============================================================
 # 1️ CARREGAR DADOS
 # ============================================================
 print(" Carregando dados...")
-df = pd.read_csv(DATA_FILE)
-df = df[df["iconic_taxon_name"] == "Aves"]
+# O dataset de 00_filter_SP.py já contém apenas aves
+df = read_observations(["id", "user_login", "scientific_name", "latitude", "longitude"])
 df = df.dropna(subset=["user_login", "scientific_name", "latitude", "longitude"])
 
 print(f" Observações: {len(df):,}")
@@ -30,40 +33,22 @@ print(f" Espécies: {df['scientific_name'].nunique():,}")
 # ============================================================
 # 2️ CRIAR MATRIZ USUÁRIO × ESPÉCIE + FEATURES
 # ============================================================
-print("\n Criando matriz usuário × espécie...")
-user_species = (
-    df.groupby(["user_login", "scientific_name"])
-      .size()
-      .unstack(fill_value=0)
-)
-
-features_extra = df.groupby("user_login").agg({
-    "latitude": "mean",
-    "longitude": "mean",
-    "id": "count",
-    "scientific_name": pd.Series.nunique
-}).rename(columns={"id": "num_observations", "scientific_name": "num_species"})
+print("\n Criando matriz usuário × espécie (CSR)...")
+user_species, users, species, features_extra = build_user_features(df, include_num_species=True)
 
-user_features = user_species.join(features_extra, how="left").fillna(0)
+# Tabela por usuário só com as features extras; as espécies ficam na matriz esparsa
+user_features = features_extra.copy()
 
 # ============================================================
 # 3️ UMAP + KMEANS (melhor setup anterior: n_neighbors=50, k=2)
 # ============================================================
 print("\n Aplicando UMAP + KMeans...")
-scaler = StandardScaler()
-X_scaled = scaler.fit_transform(user_features)
-
-reducer = umap.UMAP(
-    n_neighbors=50,
-    n_components=2,
-    random_state=42,
-    min_dist=0.1,
-    metric="euclidean"
-)
-X_umap = reducer.fit_transform(X_scaled)
-
-kmeans = KMeans(n_clusters=2, random_state=42)
-labels = kmeans.fit_predict(X_umap)
+X_scaled = cached_scaled(to_matrix(user_species, features_extra))
+
+X_umap = cached_umap(X_scaled, n_neighbors=50, min_dist=0.1)
+
+kmeans = fit_kmeans(X_umap, 2, minibatch=MINIBATCH)
+labels = predict_chunked(kmeans, X_umap)
 user_features["cluster"] = labels
 
 # ============================================================
@@ -85,16 +70,16 @@ print(summary)
 # 5️ ESPÉCIES MAIS ASSOCIADAS A CADA CLUSTER
 # ============================================================
 print("\n Identificando top espécies por cluster...")
-species_cols = user_species.columns
-top_species = []
-for c in sorted(user_features["cluster"].unique()):
-    subset = user_features[user_features["cluster"] == c][species_cols]
-    mean_freq = subset.mean().sort_values(ascending=False).head(10)
-    for sp, val in mean_freq.items():
-        top_species.append({"cluster": c, "species": sp, "mean_freq": val})
-
-top_species_df = pd.DataFrame(top_species)
-top_species_df.to_csv(f"{PROCESSED_DIR}/top_species_per_cluster.csv", index=False)
+# Média das contagens brutas (a padronização só entra no UMAP)
+clusters, mean_counts = cluster_mean_counts(user_species, user_features["cluster"])
+rows, cols, values, _ = top_k_per_row(mean_counts, 10)
+top_species_df = pd.DataFrame({
+    "cluster": clusters[rows],
+    "species": species[cols],
+    "mean_freq": values,
+})
+# top_species_per_cluster.csv é o de top_especies_por_cluster.py (contagens); aqui, a média por usuário
+top_species_df.to_csv(f"{PROCESSED_DIR}/top_species_mean_freq.csv", index=False)
 
 # ============================================================
 # 6️ PLOTS
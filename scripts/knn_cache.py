@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+knn_cache.py
+Cache em disco, endereçado por conteúdo, da matriz padronizada, do grafo kNN
+e dos embeddings UMAP compartilhados pelos scripts de clusterização.
+
+As chaves são o hash SHA-256 do conteúdo da matriz de entrada mais os
+parâmetros (métrica, k, n_neighbors...). Qualquer mudança nos dados gera uma
+chave nova; reexecutar um script com os mesmos dados só lê os arquivos.
+Um grafo kNN com k maior também atende pedidos com k menor (as colunas já
+vêm ordenadas por distância).
+"""
+
+import glob
+import hashlib
+import os
+import re
+
+import numpy as np
+import scipy.sparse as sp
+import umap.umap_ as umap
+
+from user_features import scale_features
+
+CACHE_DIR = "processed/cache"
+RANDOM_STATE = 42
+
+
+def matrix_hash(X):
+    """Hash do conteúdo (forma, dtype e valores) de uma matriz densa ou esparsa."""
+    h = hashlib.sha256()
+    if sp.issparse(X):
+        X = X.tocsr()
+        if not X.has_sorted_indices:
+            X = X.sorted_indices()
+        h.update(repr(("csr", X.shape, str(X.dtype))).encode())
+        arrays = [X.data, X.indices, X.indptr]
+    else:
+        X = np.asarray(X)
+        h.update(repr(("dense", X.shape, str(X.dtype))).encode())
+        arrays = [X]
+    for a in arrays:
+        h.update(np.ascontiguousarray(a).view(np.uint8))
+    return h.hexdigest()[:20]
+
+
+def _save_atomic(path, save_fn):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp{os.getpid()}{os.path.splitext(path)[1]}"
+    save_fn(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def cached_scaled(X, cache_dir=CACHE_DIR):
+    """scale_features(X), lido do cache quando o mesmo X já foi padronizado."""
+    key = matrix_hash(X)
+    if sp.issparse(X):
+        path = os.path.join(cache_dir, f"scaled-{key}.npz")
+        if os.path.exists(path):
+            return sp.load_npz(path).tocsr()
+        X_scaled = scale_features(X)
+        _save_atomic(path, lambda p: sp.save_npz(p, X_scaled))
+    else:
+        path = os.path.join(cache_dir, f"scaled-{key}.npy")
+        if os.path.exists(path):
+            return np.load(path)
+        X_scaled = scale_features(X)
+        _save_atomic(path, lambda p: np.save(p, X_scaled))
+    print(f" Matriz padronizada salva no cache: {path}")
+    return X_scaled
+
+
+def cached_knn(X, k, metric="euclidean", cache_dir=CACHE_DIR, random_state=RANDOM_STATE):
+    """Grafo kNN aproximado de X -> (knn_indices, knn_dists) com k colunas."""
+    key = matrix_hash(X)
+
+    # Reaproveita o menor grafo já calculado com k' >= k
+    pattern = os.path.join(cache_dir, f"knn-{key}-{metric}-k*.npz")
+    available = []
+    for path in glob.glob(pattern):
+        match = re.search(r"-k(\d+)\.npz$", path)
+        if match and int(match.group(1)) >= k:
+            available.append((int(match.group(1)), path))
+    if available:
+        _, path = min(available)
+        with np.load(path) as data:
+            return data["indices"][:, :k], data["dists"][:, :k]
+
+    print(f" Calculando grafo kNN (k={k}, metric={metric})...")
+    knn_indices, knn_dists, _ = umap.nearest_neighbors(
+        X, k, metric, {}, False, np.random.RandomState(random_state)
+    )
+    path = os.path.join(cache_dir, f"knn-{key}-{metric}-k{k}.npz")
+    _save_atomic(path, lambda p: np.savez(p, indices=knn_indices, dists=knn_dists))
+    return knn_indices, knn_dists
+
+
+def cached_umap(X, n_neighbors, min_dist=0.1, metric="euclidean", cache_dir=CACHE_DIR,
+                random_state=RANDOM_STATE):
+    """Embedding UMAP 2D de X usando o grafo kNN do cache; o próprio embedding também é cacheado."""
+    key = matrix_hash(X)
+    path = os.path.join(cache_dir, f"umap-{key}-{metric}-n{n_neighbors}-d{min_dist}-s{random_state}.npy")
+    if os.path.exists(path):
+        return np.load(path)
+
+    knn_indices, knn_dists = cached_knn(X, n_neighbors, metric, cache_dir, random_state)
+    reducer = umap.UMAP(
+        n_neighbors=n_neighbors,
+        n_components=2,
+        random_state=random_state,
+        min_dist=min_dist,
+        metric=metric,
+        precomputed_knn=(knn_indices, knn_dists, None),
+    )
+    X_umap = reducer.fit_transform(X)
+    _save_atomic(path, lambda p: np.save(p, X_umap))
+    return X_umap
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+model_io.py
+Leitura dos modelos salvos com joblib que guardam um UMAP ajustado
+(cluster_model.joblib, hdbscan_model.joblib).
+
+O UMAP ajustado sobre a matriz esparsa guarda o índice de busca do pynndescent
+(NNDescent) para o transform. A partir de 4096 usuários esse índice é um
+NNDescent esparso, e o __setstate__ do pynndescent 0.6 restaura a distância
+densa: a carga falha com TypingError do numba. load_model restaura a distância
+esparsa durante a leitura.
+"""
+
+import joblib
+from pynndescent import NNDescent
+from pynndescent import sparse as pynnd_sparse
+
+
+def _set_sparse_distance_func(index, set_distance_func):
+    set_distance_func(index)
+    if not index._is_sparse or callable(index.metric):
+        return
+    alternative = pynnd_sparse.sparse_fast_distance_alternatives.get(index.metric)
+    if alternative is not None:
+        index._distance_func = alternative["dist"]
+        index._distance_correction = alternative["correction"]
+    else:
+        index._distance_func = pynnd_sparse.sparse_named_distances[index.metric]
+
+
+def load_model(path):
+    """joblib.load com os índices NNDescent esparsos restaurados com a distância esparsa."""
+    set_distance_func = NNDescent._set_distance_func
+    NNDescent._set_distance_func = lambda index: _set_sparse_distance_func(index, set_distance_func)
+    try:
+        return joblib.load(path)
+    finally:
+        NNDescent._set_distance_func = set_distance_func
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+observations.py
+Leitura do dataset Parquet de observações gerado por 00_filter_SP.py.
+
+O dataset já contém só aves dentro da área de estudo; cada script pede apenas
+as colunas que usa (projeção de colunas no Parquet).
+
+Com keep_in_memory(True) (ativado pelo pipeline.py) as colunas lidas ficam em
+memória no processo: etapas encadeadas leem cada coluna do disco uma única vez.
+O cache é invalidado quando os arquivos do dataset mudam.
+"""
+
+import os
+
+import pandas as pd
+
+OBS_DATASET = "data_filtered/observations_sao_paulo"
+
+_keep = False
+_frames = {}  # caminho -> (assinatura dos arquivos, DataFrame com as colunas já lidas)
+
+
+def keep_in_memory(enabled=True):
+    """Liga/desliga o cache em memória das colunas lidas."""
+    global _keep
+    _keep = enabled
+    if not enabled:
+        _frames.clear()
+
+
+def _signature(path):
+    if not os.path.isdir(path):
+        info = os.stat(path)
+        return ((path, info.st_mtime_ns, info.st_size),)
+    entries = []
+    for root, _, files in os.walk(path):
+        for name in files:
+            info = os.stat(os.path.join(root, name))
+            entries.append((os.path.join(root, name), info.st_mtime_ns, info.st_size))
+    return tuple(sorted(entries))
+
+
+def read_observations(columns=None, path=OBS_DATASET):
+    """Lê as observações filtradas, apenas com as colunas pedidas."""
+    if not _keep:
+        return pd.read_parquet(path, columns=columns)
+
+    signature = _signature(path)
+    cached = _frames.get(path)
+    frame = cached[1] if cached is not None and cached[0] == signature else None
+    if columns is None:
+        if frame is None or frame.attrs.get("complete") is not True:
+            frame = pd.read_parquet(path)
+            frame.attrs["complete"] = True
+        missing = []
+    else:
+        missing = [c for c in columns if frame is None or c not in frame.columns]
+    if missing:
+        part = pd.read_parquet(path, columns=missing)
+        frame = part if frame is None else pd.concat([frame, part], axis=1)
+    _frames[path] = (signature, frame)
+    return frame.copy() if columns is None else frame[list(columns)].copy()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+outlier_labels.py
+Rótulos do HDBSCAN em disco: [user_login, cluster, is_outlier, outlier_score,
+feature_hash].
+
+feature_hash é o hash da linha de features usada na classificação
+(user_features.row_hashes): com REFIT = False, 02_hdbscansP_outline.py
+reclassifica quem tem hash diferente do atual.
+
+Fica separado de outlier_model.py para que quem só lê os rótulos (scripts de
+análise, prepare_data_app.py) não importe hdbscan nem umap.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+LABELS_PATH = "processed/user_clusters_hdbscan.parquet"
+LEGACY_LABELS_PATH = "processed/user_clusters_hdbscan.csv"
+
+
+def outlier_frame(users, labels, outlier_scores, feature_hash=None):
+    """Tabela de saída [user_login, cluster, is_outlier, outlier_score] (+ feature_hash, se informado)."""
+    labels = np.asarray(labels)
+    frame = pd.DataFrame({
+        "user_login": np.asarray(users),
+        "cluster": labels.astype(np.int32),
+        "is_outlier": labels == -1,
+        "outlier_score": np.asarray(outlier_scores, dtype=np.float32),
+    })
+    if feature_hash is not None:
+        frame["feature_hash"] = np.asarray(feature_hash, dtype=np.uint64)
+    return frame
+
+
+def read_outlier_labels(path=LABELS_PATH):
+    """Rótulos do HDBSCAN; aceita o CSV antigo (com as features duplicadas) se o Parquet não existir."""
+    if not os.path.exists(path) and os.path.exists(LEGACY_LABELS_PATH):
+        legacy = pd.read_csv(LEGACY_LABELS_PATH)
+        scores = legacy.get("outlier_score", pd.Series(np.nan, index=legacy.index))
+        return outlier_frame(legacy["user_login"], legacy["cluster"], scores)
+    return pd.read_parquet(path)
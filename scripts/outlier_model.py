@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+outlier_model.py
+Detecção de outliers de usuários com HDBSCAN sobre o embedding UMAP 2D.
+
+- A matriz padronizada vem do cache de knn_cache.py, como nas demais etapas;
+  o grafo kNN é refeito pelo próprio UMAP, que guarda o índice de busca.
+- O HDBSCAN roda com a árvore Borůvka (algorithm="boruvka_kdtree") e as
+  distâncias de núcleo calculadas em paralelo (core_dist_n_jobs).
+- O modelo (escala + UMAP + HDBSCAN com prediction_data) é salvo em disco:
+  usuários novos são projetados com UMAP.transform e classificados com
+  hdbscan.approximate_predict, sem refazer o ajuste.
+- A saída é só [user_login, cluster, is_outlier, outlier_score, feature_hash]
+  em Parquet; as features continuam no bundle esparso de user_features.py.
+  Gravação e leitura desses rótulos ficam em outlier_labels.py, sem hdbscan
+  nem umap.
+"""
+
+import hdbscan
+import joblib
+import pandas as pd
+import umap.umap_ as umap
+
+from knn_cache import cached_scaled
+from model_io import load_model
+from outlier_labels import outlier_frame
+from user_features import EXTRA_COLS, fit_scaler, row_hashes
+
+MODEL_PATH = "processed/hdbscan_model.joblib"
+
+UMAP_NEIGHBORS = 15
+MIN_CLUSTER_SIZE = 15
+MIN_SAMPLES = 10
+RANDOM_STATE = 42
+
+
+def fit_outlier_model(X, species, n_jobs=-1, random_state=RANDOM_STATE):
+    """Ajusta escala, UMAP 2D e HDBSCAN sobre X (usuários × espécies + EXTRA_COLS).
+
+    Retorna (model, X_umap, labels, outlier_scores). A matriz padronizada vem do
+    cache de knn_cache.py; o grafo kNN não: o UMAP salvo precisa do índice de
+    busca (NNDescent) para projetar usuários novos, e o cache guarda só o grafo.
+    """
+    scaler = fit_scaler(X)
+    reducer = umap.UMAP(
+        n_neighbors=UMAP_NEIGHBORS,
+        n_components=2,
+        min_dist=0.1,
+        metric="euclidean",
+        random_state=random_state,
+    )
+    X_umap = reducer.fit_transform(cached_scaled(X))
+
+    clusterer = hdbscan.HDBSCAN(
+        min_cluster_size=MIN_CLUSTER_SIZE,
+        min_samples=MIN_SAMPLES,
+        metric="euclidean",
+        algorithm="boruvka_kdtree",
+        core_dist_n_jobs=n_jobs,
+        prediction_data=True,
+    )
+    labels = clusterer.fit_predict(X_umap)
+
+    model = {
+        "scaler": scaler,
+        "umap": reducer,
+        "hdbscan": clusterer,
+        "species": pd.Index(species, name="scientific_name"),
+        "extra_cols": list(EXTRA_COLS),
+    }
+    return model, X_umap, labels, clusterer.outlier_scores_
+
+
+def predict_outliers(model, users, X):
+    """Classifica as linhas de X (vocabulário do modelo, ver build_feature_matrix) com approximate_predict.
+
+    O outlier_score dos usuários novos vem de approximate_predict_scores (GLOSH aproximado).
+    """
+    if len(users) == 0:
+        return outlier_frame([], [], [], [])
+
+    X_umap = model["umap"].transform(model["scaler"].transform(X))
+    labels, _ = hdbscan.approximate_predict(model["hdbscan"], X_umap)
+    scores = hdbscan.approximate_predict_scores(model["hdbscan"], X_umap)
+    return outlier_frame(users, labels, scores, row_hashes(X))
+
+
+def save_outlier_model(model, path=MODEL_PATH):
+    joblib.dump(model, path)
+
+
+def load_outlier_model(path=MODEL_PATH):
+    return load_model(path)
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+pipeline.py
+Executor do pipeline de scripts/ como um DAG de etapas, com cache por conteúdo.
+
+Cada etapa declara o script, as entradas e as saídas (caminhos relativos à
+pasta de dados, a mesma em que os scripts rodam hoje, ex.: Notebooks/). Uma
+etapa depende das etapas declaradas antes dela que gravam uma de suas
+entradas; cada arquivo de saída pertence a uma única etapa.
+
+- A impressão digital de uma etapa é o SHA-256 do código (o script e os
+  módulos locais que ele importa, onde ficam os parâmetros) e do conteúdo
+  das entradas. Se não mudou desde a última execução bem-sucedida e as saídas
+  existem, a etapa é pulada. Os hashes dos arquivos ficam em
+  processed/pipeline_state.json, indexados por (tamanho, mtime), para não reler
+  arquivos que não mudaram.
+- Etapas prontas ao mesmo tempo rodam em paralelo, em processos criados por
+  fork; uma etapa sozinha roda no próprio processo do executor.
+- Durante a execução, observations.read_observations guarda em memória as
+  colunas já lidas do dataset, então a cadeia lê o Parquet uma única vez e as
+  etapas paralelas herdam essas colunas do processo pai.
+
+Uso (a partir da pasta de dados):
+    python ../scripts/pipeline.py                   # executa só o que mudou
+    python ../scripts/pipeline.py --list            # mostra as etapas e o estado
+    python ../scripts/pipeline.py --force           # executa tudo
+    python ../scripts/pipeline.py --only hdbscan    # só as etapas pedidas
+    python ../scripts/pipeline.py --skip filter     # ex.: sem o export bruto nesta máquina
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import runpy
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+# Módulos locais importados pelas etapas (scripts/ e, no prepare_data_app.py, app/)
+MODULE_DIRS = [SCRIPTS_DIR, os.path.join(SCRIPTS_DIR, "..", "app")]
+STATE_PATH = "processed/pipeline_state.json"
+
+OBS = "data_filtered/observations_sao_paulo"
+FEATURES = [
+    "processed/user_features_counts.npz",
+    "processed/user_features_users.parquet",
+    "processed/user_features_species.parquet",
+]
+HDBSCAN_LABELS = "processed/user_clusters_hdbscan.parquet"
+FINAL_CLUSTERS = "processed/user_clusters_kmeans_final.csv"
+CLUSTER_MODEL = "processed/cluster_model.joblib"
+CLUSTER_SUMMARY = "processed/cluster_summary.csv"
+TOP_SPECIES = "processed/top_species_per_cluster.csv"
+TOP_SPECIES_MEAN_FREQ = "processed/top_species_mean_freq.csv"
+ECOLOGY_SUMMARY = "processed/cluster_ecology_summary.csv"
+VALIDATED_SUMMARY = "processed/cluster_validated_summary.csv"
+
+# Ordem de declaração = ordem da execução manual de hoje. Cada arquivo de saída pertence a
+# uma única etapa (dependencies() recusa saídas repetidas): uma etapa pulada não pode ter
+# a saída sobrescrita por outra sem que o cache perceba
+STAGES = [
+    {"name": "filter", "script": "00_filter_SP.py",
+     "inputs": ["../app/regioes.json"], "outputs": [OBS]},
+    {"name": "user_features", "script": "01_user_species_pipeline.py",
+     "inputs": [OBS],
+     "outputs": FEATURES + ["processed/umap_kmeans_silhouette_summary.csv", "processed/user_umap_ready.npy"]},
+    {"name": "hdbscan", "script": "02_hdbscansP_outline.py",
+     "inputs": FEATURES + [OBS], "outputs": [HDBSCAN_LABELS, "processed/hdbscan_model.joblib"]},
+    {"name": "cleaned_sweep", "script": "cleaned_umap_kmens.py",
+     "inputs": FEATURES + [HDBSCAN_LABELS, "processed/umap_kmeans_silhouette_summary.csv"],
+     "outputs": ["processed/umap_kmeans_silhouette_cleaned.csv"]},
+    {"name": "final_clusters", "script": "03_fit_final_clusters.py",
+     "inputs": FEATURES + [HDBSCAN_LABELS], "outputs": [CLUSTER_MODEL, FINAL_CLUSTERS]},
+    {"name": "cluster_validated", "script": "cluster_validated.py",
+     "inputs": [OBS], "outputs": [CLUSTER_SUMMARY, TOP_SPECIES_MEAN_FREQ]},
+    {"name": "top_species", "script": "top_species_per_cluster.py",
+     "inputs": FEATURES,
+     "outputs": ["processed/cluster_summary_top_species.csv", "processed/top_species_per_cluster_wide.csv"]},
+    {"name": "ecology", "script": "cluster_ecology_analysis.py",
+     "inputs": [OBS, FINAL_CLUSTERS, CLUSTER_SUMMARY], "outputs": ["processed/cluster_species_summary.csv"]},
+    {"name": "ecology_cleaned", "script": "cluster_ecology_cleanded.py",
+     "inputs": [OBS, HDBSCAN_LABELS], "outputs": [ECOLOGY_SUMMARY]},
+    {"name": "top_especies", "script": "top_especies_por_cluster.py",
+     "inputs": [OBS, HDBSCAN_LABELS], "outputs": [TOP_SPECIES]},
+    {"name": "validated_summary", "script": "cluster_validated_cleaned.py",
+     "inputs": [ECOLOGY_SUMMARY, TOP_SPECIES], "outputs": [VALIDATED_SUMMARY]},
+    {"name": "heat_map", "script": "heat_map.py",
+     "inputs": [CLUSTER_SUMMARY], "outputs": ["figs/cluster_centroids_map.png"]},
+    {"name": "map_final", "script": "map_final.py",
+     "inputs": [VALIDATED_SUMMARY], "outputs": ["processed/map_clusters_sao_paulo_2.png"]},
+    {"name": "plot_mapa", "script": "plot_mapa.py",
+     "inputs": [VALIDATED_SUMMARY], "outputs": ["processed/map_clusters_final.png"]},
+    {"name": "prepare_app", "script": "../Notebooks/prepare_data_app.py",
+     "inputs": [OBS, HDBSCAN_LABELS, FINAL_CLUSTERS, CLUSTER_MODEL, "../app/regioes.json"], "outputs": ["../app/artifacts/sao_paulo"]},
+]
+STAGES_BY_NAME = {stage["name"]: stage for stage in STAGES}
+
+
+def dependencies(stages=STAGES):
+    """{etapa: etapas anteriores que gravam uma de suas entradas}; ValueError se duas etapas gravam o mesmo arquivo."""
+    owner = {}
+    for stage in stages:
+        for path in stage["outputs"]:
+            if path in owner:
+                raise ValueError(f"{path} é saída de {owner[path]} e de {stage['name']}")
+            owner[path] = stage["name"]
+
+    deps = {}
+    for i, stage in enumerate(stages):
+        inputs = set(stage["inputs"])
+        deps[stage["name"]] = {prev["name"] for prev in stages[:i] if inputs & set(prev["outputs"])}
+    return deps
+
+
+# ============================================================
+# HASHES
+# ============================================================
+def _file_sha(path, file_hashes):
+    """SHA-256 do arquivo, reaproveitado de file_hashes se tamanho e mtime não mudaram."""
+    info = os.stat(path)
+    key = os.path.abspath(path)
+    cached = file_hashes.get(key)
+    if cached and cached[0] == info.st_size and cached[1] == info.st_mtime_ns:
+        return cached[2]
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    file_hashes[key] = [info.st_size, info.st_mtime_ns, h.hexdigest()]
+    return h.hexdigest()
+
+
+def path_hash(path, file_hashes):
+    """Hash de um arquivo ou de uma pasta (nomes relativos + conteúdo de cada arquivo)."""
+    h = hashlib.sha256()
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path, followlinks=True):
+            dirs.sort()
+            for name in sorted(files):
+                full = os.path.join(root, name)
+                h.update(os.path.relpath(full, path).encode())
+                h.update(_file_sha(full, file_hashes).encode())
+    else:
+        h.update(_file_sha(path, file_hashes).encode())
+    return h.hexdigest()
+
+
+def code_files(script):
+    """O script e os módulos locais (MODULE_DIRS) que ele importa, transitivamente."""
+    pending, seen = [script], []
+    while pending:
+        path = pending.pop()
+        if path in seen or not os.path.exists(path):
+            continue
+        seen.append(path)
+        with open(path, encoding="utf-8") as f:
+            source = f.read()
+        for module in re.findall(r"^\s*(?:from|import)\s+(\w+)", source, flags=re.MULTILINE):
+            pending.extend(os.path.join(folder, f"{module}.py") for folder in MODULE_DIRS)
+    return sorted(os.path.normpath(path) for path in seen)
+
+
+def fingerprint(stage, file_hashes):
+    """Impressão digital da etapa, ou None se faltar alguma entrada."""
+    h = hashlib.sha256()
+    for path in code_files(os.path.join(SCRIPTS_DIR, stage["script"])):
+        h.update(_file_sha(path, file_hashes).encode())
+    for path in stage["inputs"]:
+        if not os.path.exists(path):
+            return None
+        h.update(path.encode())
+        h.update(path_hash(path, file_hashes).encode())
+    return h.hexdigest()
+
+
+def load_state(path=STATE_PATH):
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    return {"stages": {}, "files": {}}
+
+
+def save_state(state, path=STATE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+# ============================================================
+# EXECUÇÃO
+# ============================================================
+def run_stage(name):
+    """Executa o script da etapa neste processo; retorna (nome, ok, segundos)."""
+    stage = STAGES_BY_NAME[name]
+    print(f"\n▶ [{name}] {stage['script']}", flush=True)
+    start = time.perf_counter()
+    ok = True
+    path = os.path.join(SCRIPTS_DIR, stage["script"])
+    # Os scripts com argparse (prepare_data_app.py) não podem ver as opções do runner
+    argv, sys.argv = sys.argv, [path]
+    try:
+        runpy.run_path(path, run_name="__main__")
+    except SystemExit as e:
+        ok = e.code in (None, 0)
+    except Exception:
+        traceback.print_exc()
+        ok = False
+    finally:
+        sys.argv = argv
+    return name, ok, time.perf_counter() - start
+
+
+def run_pipeline(selected=None, skipped=(), force=False, jobs=None):
+    """Executa as etapas pendentes em ordem topológica; retorna True se nenhuma falhou."""
+    import matplotlib
+    matplotlib.use("Agg")
+    sys.path.insert(0, SCRIPTS_DIR)
+    import observations
+    observations.keep_in_memory(True)
+
+    state = load_state()
+    deps = dependencies()
+    done, failed = set(), set()
+    remaining = [stage["name"] for stage in STAGES]
+    fingerprints = {}
+
+    while remaining:
+        ready = [name for name in remaining if deps[name] <= done | failed]
+        to_run = []
+        for name in ready:
+            remaining.remove(name)
+            stage = STAGES_BY_NAME[name]
+            if deps[name] & failed:
+                print(f"✖ [{name}] não executada: dependência falhou")
+                failed.add(name)
+                continue
+            if name in skipped or (selected and name not in selected):
+                done.add(name)
+                continue
+
+            fingerprints[name] = fingerprint(stage, state["files"])
+            up_to_date = (
+                fingerprints[name] is not None
+                and state["stages"].get(name) == fingerprints[name]
+                and all(os.path.exists(path) for path in stage["outputs"])
+            )
+            if up_to_date and not force:
+                print(f"✔ [{name}] sem mudanças, pulada")
+                done.add(name)
+            else:
+                to_run.append(name)
+
+        if len(to_run) == 1:
+            results = [run_stage(to_run[0])]
+        elif to_run:
+            print(f"\n⇉ Em paralelo: {', '.join(to_run)}")
+            context = multiprocessing.get_context("fork")
+            with ProcessPoolExecutor(max_workers=min(len(to_run), jobs or os.cpu_count() or 1),
+                                     mp_context=context) as executor:
+                results = list(executor.map(run_stage, to_run))
+        else:
+            results = []
+
+        for name, ok, seconds in results:
+            if ok:
+                print(f"✔ [{name}] concluída em {seconds:.1f}s")
+                done.add(name)
+                # Entradas lidas antes da execução: a etapa só é refeita se elas mudarem depois
+                if fingerprints[name] is None:
+                    fingerprints[name] = fingerprint(STAGES_BY_NAME[name], state["files"])
+                state["stages"][name] = fingerprints[name]
+            else:
+                print(f"✖ [{name}] falhou")
+                failed.add(name)
+        save_state(state)
+
+    return not failed
+
+
+def print_status():
+    state = load_state()
+    deps = dependencies()
+    for stage in STAGES:
+        current = fingerprint(stage, state["files"])
+        if current is None:
+            status = "entradas ausentes"
+        elif state["stages"].get(stage["name"]) == current and all(os.path.exists(p) for p in stage["outputs"]):
+            status = "atualizada"
+        else:
+            status = "pendente"
+        after = f" (depois de: {', '.join(sorted(deps[stage['name']]))})" if deps[stage["name"]] else ""
+        print(f" {stage['name']:<18} {status:<18} {stage['script']}{after}")
+    save_state(state)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Executa o pipeline de scripts/ pulando etapas sem mudanças.")
+    parser.add_argument("--only", nargs="+", choices=list(STAGES_BY_NAME), help="executa só estas etapas")
+    parser.add_argument("--skip", nargs="+", choices=list(STAGES_BY_NAME), default=[], help="não executa estas etapas")
+    parser.add_argument("--force", action="store_true", help="executa mesmo sem mudanças")
+    parser.add_argument("--jobs", type=int, help="máximo de etapas em paralelo")
+    parser.add_argument("--list", action="store_true", help="mostra as etapas e o estado de cada uma")
+    args = parser.parse_args()
+
+    if args.list:
+        print_status()
+    else:
+        sys.exit(0 if run_pipeline(set(args.only or ()), set(args.skip), args.force, args.jobs) else 1)
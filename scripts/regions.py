@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+regions.py
+Registro de regiões (app/regioes.json) e atribuição vetorizada de pontos a regiões.
+
+Cada região tem um bbox e, opcionalmente, um polígono. Para atribuir um bloco
+de observações:
+- os pontos são mapeados para células de uma grade regular (CELL_SIZE graus);
+  cada região conhece as células que o seu bbox toca, então só os pontos
+  dessas células são testados;
+- os candidatos passam pelo teste do bbox e, quando a região tem polígono,
+  pelo point-in-polygon vetorizado do matplotlib (Path.contains_points).
+"""
+
+import os
+import sys
+
+import numpy as np
+from matplotlib.path import Path
+
+# O registro é lido pelo mesmo código do app, que completa bbox e hemisfério
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+from regioes import carregar_regioes as load_regions
+
+CELL_SIZE = 0.5
+
+
+def _cell_ids(lat, lon, cell_size):
+    rows = np.floor((np.asarray(lat) + 90.0) / cell_size).astype(np.int64)
+    cols = np.floor((np.asarray(lon) + 180.0) / cell_size).astype(np.int64)
+    return rows * int(np.ceil(360.0 / cell_size)) + cols
+
+
+def build_region_index(regions, cell_size=CELL_SIZE):
+    """Pré-calcula, para cada região, as células da grade que o bbox cobre e o polígono (se houver)."""
+    index = {"cell_size": cell_size, "regions": {}}
+    for key, region in regions.items():
+        bbox = region["bbox"]
+        lats = np.arange(bbox["lat_min"], bbox["lat_max"] + cell_size, cell_size).clip(max=bbox["lat_max"])
+        lons = np.arange(bbox["lon_min"], bbox["lon_max"] + cell_size, cell_size).clip(max=bbox["lon_max"])
+        grid_lat, grid_lon = np.meshgrid(lats, lons, indexing="ij")
+        index["regions"][key] = {
+            "bbox": bbox,
+            "cells": np.unique(_cell_ids(grid_lat.ravel(), grid_lon.ravel(), cell_size)),
+            "path": Path(np.asarray(region["poligono"])[:, ::-1]) if "poligono" in region else None,
+        }
+    return index
+
+
+def assign_regions(index, lat, lon):
+    """Retorna {chave: máscara booleana} com os pontos (lat, lon) dentro de cada região.
+
+    Regiões sobrepostas podem marcar o mesmo ponto; regiões sem nenhum ponto
+    não aparecem no resultado.
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    cells, inverse = np.unique(_cell_ids(lat, lon, index["cell_size"]), return_inverse=True)
+
+    masks = {}
+    for key, region in index["regions"].items():
+        candidates = np.flatnonzero(np.isin(cells, region["cells"])[inverse])
+        if len(candidates) == 0:
+            continue
+
+        bbox = region["bbox"]
+        c_lat, c_lon = lat[candidates], lon[candidates]
+        inside = (
+            (c_lat >= bbox["lat_min"]) & (c_lat <= bbox["lat_max"]) &
+            (c_lon >= bbox["lon_min"]) & (c_lon <= bbox["lon_max"])
+        )
+        if region["path"] is not None and inside.any():
+            points = np.column_stack([c_lon[inside], c_lat[inside]])
+            inside[inside] = region["path"].contains_points(points)
+        if not inside.any():
+            continue
+
+        mask = np.zeros(len(lat), dtype=bool)
+        mask[candidates[inside]] = True
+        masks[key] = mask
+    return masks
+
+
+def dataset_path(key, data_dir="data_filtered"):
+    """Caminho do dataset Parquet de observações de uma região."""
+    return os.path.join(data_dir, f"observations_{key}")
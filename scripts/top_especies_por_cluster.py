@@ -3,19 +3,19 @@
 # Gera lista de espécies mais observadas por cluster de usuários
 # ============================================================
 
-import pandas as pd
 from pathlib import Path
 
+from observations import read_observations
+from outlier_labels import read_outlier_labels
+from cluster_stats import cluster_stats, top_k_per_group
+
 # -------------------------------
 # 1️ Carregar dados
 # -------------------------------
 print(" Carregando dados...")
 
-obs_path = Path("data_filtered/observations_sao_paulo.csv")
-clusters_path = Path("processed/user_clusters_hdbscan.csv")
-
-obs = pd.read_csv(obs_path)
-clusters = pd.read_csv(clusters_path)
+obs = read_observations(["user_login", "common_name", "species_guess"])
+clusters = read_outlier_labels()
 
 print(f" Observações: {len(obs):,}")
 print(f" Usuários (clusters): {len(clusters):,}")
@@ -35,38 +35,33 @@ for c in ["user_cluster", "cluster"]:
 if cluster_col is None:
     raise ValueError(" Nenhuma coluna de cluster ('user_cluster' ou 'cluster') encontrada!")
 
-print(f" Fazendo merge usando: user_login e coluna de cluster '{cluster_col}'")
+print(f" Associando observações por user_login e coluna de cluster '{cluster_col}'")
 
 # -------------------------------
-# 3️ Merge observações + clusters
-# -------------------------------
-merged = obs.merge(clusters[["user_login", cluster_col]], on="user_login", how="inner")
-
-print(f" Merge concluído: {len(merged):,} observações associadas a clusters")
-
-# -------------------------------
-# 4️ Filtrar outliers (se existir)
+# 3️ Filtrar outliers (se existir)
 # -------------------------------
+labels = clusters[["user_login", cluster_col]].rename(columns={cluster_col: "cluster"})
 if "is_outlier" in clusters.columns:
-    merged = merged[~merged[cluster_col].isin(clusters.loc[clusters["is_outlier"], cluster_col])]
-    print(f" Após remoção de outliers: {len(merged):,} observações")
+    labels = labels[~labels["cluster"].isin(clusters.loc[clusters["is_outlier"], cluster_col])]
 
 # -------------------------------
-# 5️ Calcular top espécies por cluster
+# 4️ Calcular top espécies por cluster (uma passada, sem merge)
 # -------------------------------
-if "common_name" not in merged.columns and "species_guess" in merged.columns:
-    merged["common_name"] = merged["species_guess"]
+if "common_name" not in obs.columns and "species_guess" in obs.columns:
+    obs["common_name"] = obs["species_guess"]
+
+summary, species_counts = cluster_stats(obs, labels, species_col="common_name", lat_col=None, lon_col=None)
+print(f" Observações associadas a clusters (sem outliers): {summary['n_observations'].sum():,}")
 
 cluster_species = (
-    merged.groupby(cluster_col)["common_name"]
-    .value_counts()
-    .groupby(level=0)
-    .head(10)
-    .reset_index(name="count")
+    top_k_per_group(species_counts, "cluster", "count", 10, prop_col=None)
+    .rename(columns={"cluster": cluster_col})
+    [[cluster_col, "common_name", "count"]]
+    .reset_index(drop=True)
 )
 
 # -------------------------------
-# 6️ Gerar resumo final
+# 5️ Gerar resumo final
 # -------------------------------
 summary_path = Path("processed/top_species_per_cluster.csv")
 cluster_species.to_csv(summary_path, index=False)
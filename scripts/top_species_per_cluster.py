@@ -1,50 +1,48 @@
 import os
-import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
-from sklearn.preprocessing import StandardScaler
-import umap.umap_ as umap
-from sklearn.cluster import KMeans
+
+from knn_cache import cached_scaled, cached_umap
+from cluster_model import fit_kmeans, predict_chunked
+from user_features import load_user_features, to_matrix, cluster_mean_counts
+from cluster_stats import top_k_per_row
 
 # ============================================================
 # CONFIGURAÇÕES
 # ============================================================
-DATA_PATH = "processed/user_features_normalized.csv"
 FIG_DIR = "figs/cluster_analysis"
 os.makedirs(FIG_DIR, exist_ok=True)
 
 # Melhor setup encontrado
 N_NEIGHBORS = 100
 BEST_K = 2
+MINIBATCH = False  # MiniBatchKMeans em blocos para bases muito grandes
+
+# Saídas próprias: cluster_summary.csv e top_species_per_cluster.csv são de cluster_validated.py e
+# top_especies_por_cluster.py, com outros formatos
+SUMMARY_FILE = "processed/cluster_summary_top_species.csv"
+TOP_SPECIES_FILE = "processed/top_species_per_cluster_wide.csv"
 
 print(f" Analisando clusters com n_neighbors={N_NEIGHBORS}, K={BEST_K}")
 
 # ============================================================
 # 1️ CARREGAR DADOS
 # ============================================================
-df = pd.read_csv(DATA_PATH, index_col=0)
-species_cols = [c for c in df.columns if c not in ['latitude', 'longitude', 'num_observations']]
+user_species, users, species, features_extra = load_user_features()
+df = features_extra.copy()
 
-print(f" Dados carregados: {df.shape[0]} usuários × {len(species_cols)} espécies/features")
+print(f" Dados carregados: {df.shape[0]} usuários × {len(species)} espécies/features")
 
 # ============================================================
 # 2️ NORMALIZAR E RECRIAR EMBEDDING + CLUSTERS
 # ============================================================
-scaler = StandardScaler()
-X_scaled = scaler.fit_transform(df)
+X_scaled = cached_scaled(to_matrix(user_species, features_extra))
 
-reducer = umap.UMAP(
-    n_neighbors=N_NEIGHBORS,
-    n_components=2,
-    random_state=42,
-    min_dist=0.1,
-    metric="euclidean"
-)
-X_umap = reducer.fit_transform(X_scaled)
+X_umap = cached_umap(X_scaled, n_neighbors=N_NEIGHBORS, min_dist=0.1)
 
-km = KMeans(n_clusters=BEST_K, random_state=42)
-df["cluster"] = km.fit_predict(X_umap)
+km = fit_kmeans(X_umap, BEST_K, minibatch=MINIBATCH)
+df["cluster"] = predict_chunked(km, X_umap)
 
 # Salvar coordenadas UMAP
 df["umap_x"] = X_umap[:, 0]
@@ -61,22 +59,21 @@ summary = df.groupby("cluster").agg({
     "num_observations": ["mean", "sum", "count"]
 })
 summary.columns = ["lat_mean", "lon_mean", "obs_mean", "obs_sum", "n_users"]
-summary.to_csv("processed/cluster_summary.csv")
-print("\n📊 Resumo geral salvo em processed/cluster_summary.csv")
+summary.to_csv(SUMMARY_FILE)
+print(f"\n📊 Resumo geral salvo em {SUMMARY_FILE}")
 print(summary)
 
 # ============================================================
 # 4️ ESPÉCIES MAIS REPRESENTATIVAS POR CLUSTER
 # ============================================================
-top_species = {}
-for c in df["cluster"].unique():
-    sub = df[df["cluster"] == c][species_cols]
-    mean_counts = sub.mean().sort_values(ascending=False)
-    top_species[c] = mean_counts.head(15).index.tolist()
-
-top_species_df = pd.DataFrame.from_dict(top_species, orient="index").T
-top_species_df.to_csv("processed/top_species_per_cluster.csv", index=False)
-print("\n🕊️ Top espécies salvas em processed/top_species_per_cluster.csv")
+# Média das contagens brutas, como no user_features_normalized.csv original
+# (apesar do nome, o CSV guardava a matriz sem padronizar)
+clusters, mean_counts = cluster_mean_counts(user_species, df["cluster"])
+rows, cols, _, _ = top_k_per_row(mean_counts, 15)
+# Uma coluna por cluster, com as espécies em ordem decrescente de média
+top_species_df = pd.DataFrame({c: pd.Series(species[cols[rows == i]]) for i, c in enumerate(clusters)})
+top_species_df.to_csv(TOP_SPECIES_FILE, index=False)
+print(f"\n🕊️ Top espécies salvas em {TOP_SPECIES_FILE}")
 
 # ============================================================
 # 5️ GRÁFICOS
@@ -89,7 +86,7 @@ plt.title(f"Distribuição UMAP + KMeans (K={BEST_K}, n_neighbors={N_NEIGHBORS})
 plt.xlabel("UMAP-1")
 plt.ylabel("UMAP-2")
 plt.tight_layout()
-plt.savefig(f"{FIG_DIR}/umap_clusters.png", dpi=300)
+plt.savefig(f"{FIG_DIR}/umap_clusters_n{N_NEIGHBORS}.png", dpi=300)
 plt.close()
 
 # --- 5.2 Distribuição geográfica
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+umap_kmeans_sweep.py
+Varredura paralela de hiperparâmetros UMAP (n_neighbors) × KMeans (K).
+
+- O grafo kNN é calculado uma única vez para o maior n_neighbors, pelo cache de
+  knn_cache.py (o mesmo das demais etapas); o UMAP poda as colunas excedentes
+  para cada valor menor (precomputed_knn).
+- Embeddings e candidatos (n_neighbors, K) rodam em paralelo (joblib/loky,
+  sem exigir guarda `if __name__ == "__main__"` nos scripts).
+- A triagem dos K usa silhouette amostrado; só o melhor K de cada n_neighbors
+  tem o silhouette calculado sobre todos os pontos.
+- Com minibatch=True cada K roda em MiniBatchKMeans por blocos (cluster_model.fit_kmeans).
+"""
+
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.metrics import silhouette_score
+import umap.umap_ as umap
+
+from cluster_model import fit_kmeans, predict_chunked
+from knn_cache import cached_knn
+
+NEIGHBORS_LIST = [5, 10, 15, 20, 30, 50, 100]
+K_RANGE = range(2, 15)
+SILHOUETTE_SAMPLE = 5000
+RANDOM_STATE = 42
+
+
+def _embed(X, n_neighbors, knn, random_state):
+    reducer = umap.UMAP(
+        n_neighbors=n_neighbors,
+        n_components=2,
+        random_state=random_state,
+        min_dist=0.1,
+        metric="euclidean",
+        precomputed_knn=(knn[0], knn[1], None),
+    )
+    return n_neighbors, reducer.fit_transform(X)
+
+
+def _score_k(n_neighbors, X_umap, k, sample_size, random_state, minibatch):
+    labels = predict_chunked(fit_kmeans(X_umap, k, minibatch=minibatch, random_state=random_state), X_umap)
+    if sample_size is not None and sample_size >= len(X_umap):
+        sample_size = None
+    score = silhouette_score(X_umap, labels, sample_size=sample_size, random_state=random_state)
+    return n_neighbors, k, score, labels
+
+
+def _full_score(n_neighbors, X_umap, labels):
+    return n_neighbors, silhouette_score(X_umap, labels)
+
+
+def run_sweep(X, neighbors_list=NEIGHBORS_LIST, k_range=K_RANGE, n_jobs=-1,
+              sample_size=SILHOUETTE_SAMPLE, knn=None, random_state=RANDOM_STATE, minibatch=False):
+    """Executa a varredura e retorna (summary, embeddings, best_labels).
+
+    summary     -> DataFrame [n_neighbors, best_k, silhouette_score] (mesmo formato
+                   de umap_kmeans_silhouette_summary.csv)
+    embeddings  -> {n_neighbors: X_umap}
+    best_labels -> {n_neighbors: rótulos do melhor K}
+    knn         -> (knn_indices, knn_dists) já calculado com >= max(neighbors_list) vizinhos
+    """
+    neighbors_list = list(neighbors_list)
+    if knn is None:
+        knn = cached_knn(X, max(neighbors_list), random_state=random_state)
+
+    parallel = Parallel(n_jobs=n_jobs)
+
+    print(f" Gerando {len(neighbors_list)} embeddings UMAP em paralelo...")
+    embeddings = dict(parallel(
+        delayed(_embed)(X, n, knn, random_state) for n in neighbors_list
+    ))
+
+    print(f" Avaliando {len(neighbors_list) * len(k_range)} combinações (n_neighbors, K)...")
+    candidates = parallel(
+        delayed(_score_k)(n, embeddings[n], k, sample_size, random_state, minibatch)
+        for n in neighbors_list for k in k_range
+    )
+
+    best = {}
+    for n, k, score, labels in candidates:
+        if n not in best or score > best[n][1]:
+            best[n] = (k, score, labels)
+
+    # Silhouette completo apenas para o vencedor de cada n_neighbors
+    full_scores = dict(parallel(
+        delayed(_full_score)(n, embeddings[n], best[n][2]) for n in neighbors_list
+    ))
+
+    summary = pd.DataFrame(
+        [(n, best[n][0], full_scores[n]) for n in neighbors_list],
+        columns=["n_neighbors", "best_k", "silhouette_score"],
+    )
+    best_labels = {n: best[n][2] for n in neighbors_list}
+    return summary, embeddings, best_labels
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+user_features.py
+Matriz usuário × espécie esparsa (CSR) e features extras por usuário.
+
+Substitui o pivot denso groupby(...).size().unstack(fill_value=0): a matriz de
+contagens, o vocabulário de espécies (ordem das colunas) e as features extras
+(latitude/longitude médias, num_observations) são salvos lado a lado em
+processed/user_features_*.
+"""
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.preprocessing import StandardScaler
+
+FEATURES_PREFIX = "processed/user_features"
+EXTRA_COLS = ["latitude", "longitude", "num_observations"]
+
+
+def build_user_features(df, include_num_species=False, species=None):
+    """Constrói (counts, users, species, extra) a partir das observações.
+
+    counts  -> csr_matrix float32 (usuários × espécies) com o número de registros
+    users   -> Index de user_login (ordem das linhas)
+    species -> Index de scientific_name (ordem das colunas)
+    extra   -> DataFrame indexado por user_login com EXTRA_COLS (+ num_species)
+
+    Com `species` informado, as colunas seguem esse vocabulário (o do modelo já
+    treinado) e espécies fora dele são ignoradas nas contagens.
+    """
+    user_codes, users = pd.factorize(df["user_login"], sort=True)
+    if species is None:
+        species_codes, species = pd.factorize(df["scientific_name"], sort=True)
+    else:
+        species_codes = pd.Categorical(df["scientific_name"], categories=species).codes
+    users = pd.Index(users, name="user_login")
+    species = pd.Index(species, name="scientific_name")
+
+    known = species_codes >= 0
+    counts = sp.csr_matrix(
+        (np.ones(known.sum(), dtype=np.float32), (user_codes[known], species_codes[known])),
+        shape=(len(users), len(species)),
+    )
+    counts.sum_duplicates()
+
+    agg = {
+        "latitude": ("latitude", "mean"),
+        "longitude": ("longitude", "mean"),
+        "num_observations": ("id", "count"),
+    }
+    if include_num_species:
+        agg["num_species"] = ("scientific_name", "nunique")
+    extra = df.groupby("user_login").agg(**agg).reindex(users).fillna(0)
+
+    return counts, users, species, extra
+
+
+def build_feature_matrix(df, species, extra_cols=EXTRA_COLS):
+    """Matriz de features de observações novas no vocabulário de um modelo já ajustado -> (users, X).
+
+    df precisa das colunas id, user_login, scientific_name, latitude e longitude;
+    registros sem esses dados são descartados.
+    """
+    df = df.dropna(subset=["user_login", "scientific_name", "latitude", "longitude"])
+    counts, users, _, extra = build_user_features(df, species=species)
+    return users, to_matrix(counts, extra[list(extra_cols)])
+
+
+def to_matrix(counts, extra):
+    """Junta contagens e features extras numa única matriz CSR (colunas extras no final)."""
+    return sp.hstack([counts, sp.csr_matrix(extra.to_numpy(dtype=np.float32))], format="csr")
+
+
+def row_hashes(X):
+    """Hash uint64 de cada linha de X (colunas e valores não nulos), para detectar usuários cujas features mudaram.
+
+    É a soma dos hashes das entradas (coluna, valor), então não depende da ordem
+    dos índices dentro da linha.
+    """
+    X = sp.csr_matrix(X, dtype=np.float32, copy=True)
+    X.sum_duplicates()
+    X.eliminate_zeros()
+    keys = (X.indices.astype(np.uint64) << np.uint64(32)) | X.data.view(np.uint32).astype(np.uint64)
+    sums = np.zeros(len(keys) + 1, dtype=np.uint64)
+    np.cumsum(pd.util.hash_array(keys), out=sums[1:])
+    return sums[X.indptr[1:]] - sums[X.indptr[:-1]]
+
+
+def scale_features(X):
+    """Padroniza sem centralizar, preservando a esparsidade.
+
+    Centralizar é uma translação e não altera distâncias euclidianas, então o
+    UMAP/kNN sobre o resultado é equivalente ao StandardScaler denso.
+    """
+    return fit_scaler(X).transform(X)
+
+
+def fit_scaler(X):
+    """StandardScaler (sem centralizar) ajustado em X, para reaplicar a usuários novos."""
+    return StandardScaler(with_mean=False).fit(X)
+
+
+def save_user_features(counts, users, species, extra, prefix=FEATURES_PREFIX):
+    sp.save_npz(f"{prefix}_counts.npz", counts)
+    extra.reset_index().to_parquet(f"{prefix}_users.parquet", index=False)
+    pd.DataFrame({"scientific_name": species}).to_parquet(f"{prefix}_species.parquet", index=False)
+
+
+def load_user_features(prefix=FEATURES_PREFIX):
+    """Lê o bundle salvo por save_user_features -> (counts, users, species, extra)."""
+    counts = sp.load_npz(f"{prefix}_counts.npz").tocsr()
+    extra = pd.read_parquet(f"{prefix}_users.parquet").set_index("user_login")
+    species = pd.Index(pd.read_parquet(f"{prefix}_species.parquet")["scientific_name"])
+    return counts, extra.index, species, extra
+
+
+def cluster_mean_counts(counts, labels):
+    """Média das contagens por espécie dentro de cada cluster, sem densificar a matriz de usuários.
+
+    Retorna (clusters, médias) com médias.shape == (len(clusters), n_espécies).
+    """
+    clusters, codes = np.unique(np.asarray(labels), return_inverse=True)
+    membership = sp.csr_matrix(
+        (np.ones(len(codes), dtype=np.float32), (codes, np.arange(len(codes)))),
+        shape=(len(clusters), len(codes)),
+    )
+    sums = np.asarray((membership @ counts).todense())
+    return clusters, sums / np.bincount(codes)[:, None]